@@ -0,0 +1,57 @@
+"""Added session refresh_jti and indexes
+
+Revision ID: b09a7c4c68a0
+Revises: 95b2dd90026f
+Create Date: 2026-10-18 11:02:17.904512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b09a7c4c68a0'
+down_revision: Union[str, None] = '95b2dd90026f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('sessions', sa.Column('refresh_jti', sa.UUID(), nullable=True))
+    # jti активных сессий достаем из полезной нагрузки сохраненного токена (base64url).
+    op.execute("""
+        UPDATE sessions
+        SET refresh_jti = (
+            convert_from(
+                decode(
+                    rpad(
+                        translate(split_part(refresh_token, '.', 2), '-_', '+/'),
+                        (length(split_part(refresh_token, '.', 2)) + 3) / 4 * 4,
+                        '='
+                    ),
+                    'base64'
+                ),
+                'UTF8'
+            )::json ->> 'jti'
+        )::uuid
+        WHERE refresh_jti IS NULL AND revoked_at IS NULL AND expire >= now() AT TIME ZONE 'utc'
+    """)
+    # Индексы строим без блокировки записи в таблицу.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_sessions_user_id_expire', 'sessions', ['user_id', 'expire'],
+            postgresql_where=sa.text('revoked_at IS NULL'), postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_sessions_user_id_created_at', 'sessions', ['user_id', sa.text('created_at DESC')],
+            postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_sessions_user_id_created_at', table_name='sessions', postgresql_concurrently=True)
+        op.drop_index('ix_sessions_user_id_expire', table_name='sessions', postgresql_concurrently=True)
+    op.drop_column('sessions', 'refresh_jti')
@@ -0,0 +1,38 @@
+"""Added session history keyset index
+
+Revision ID: b9d865c884f6
+Revises: b09a7c4c68a0
+Create Date: 2026-10-18 11:48:53.120377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9d865c884f6'
+down_revision: Union[str, None] = 'b09a7c4c68a0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Курсор истории входов - (created_at, id), индекс должен покрывать оба поля.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_sessions_user_id_created_at_id', 'sessions',
+            ['user_id', sa.text('created_at DESC'), sa.text('id DESC')],
+            postgresql_concurrently=True
+        )
+        op.drop_index('ix_sessions_user_id_created_at', table_name='sessions', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_sessions_user_id_created_at', 'sessions', ['user_id', sa.text('created_at DESC')],
+            postgresql_concurrently=True
+        )
+        op.drop_index('ix_sessions_user_id_created_at_id', table_name='sessions', postgresql_concurrently=True)
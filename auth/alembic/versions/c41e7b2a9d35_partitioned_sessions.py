@@ -0,0 +1,105 @@
+"""Partitioned sessions by created_at
+
+Revision ID: c41e7b2a9d35
+Revises: b9d865c884f6
+Create Date: 2026-10-18 20:05:41.316904
+
+"""
+from datetime import date, datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41e7b2a9d35'
+down_revision: Union[str, None] = 'b9d865c884f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Сколько месяцев вперед создаются секции. Дальше их создает cli/sessions_partitions.py.
+MONTHS_AHEAD = 3
+
+COLUMNS = 'id, user_id, refresh_token, refresh_jti, expire, revoked_at, created_at, modified_at'
+
+
+def add_months(month: date, months: int) -> date:
+    month_index = month.year * 12 + month.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def create_indexes() -> None:
+    op.create_index(
+        'ix_sessions_user_id_expire', 'sessions', ['user_id', 'expire'],
+        postgresql_where=sa.text('revoked_at IS NULL')
+    )
+    op.create_index(
+        'ix_sessions_user_id_created_at_id', 'sessions',
+        ['user_id', sa.text('created_at DESC'), sa.text('id DESC')]
+    )
+
+
+def upgrade() -> None:
+    # Таблица переписывается целиком под исключительной блокировкой: миграцию выполняют при остановленном сервисе.
+    op.execute('ALTER TABLE sessions RENAME TO sessions_plain')
+    op.execute('ALTER TABLE sessions_plain RENAME CONSTRAINT sessions_pkey TO sessions_plain_pkey')
+    op.execute('ALTER INDEX ix_sessions_user_id_expire RENAME TO ix_sessions_plain_user_id_expire')
+    op.execute('ALTER INDEX ix_sessions_user_id_created_at_id RENAME TO ix_sessions_plain_user_id_created_at_id')
+    # Ключ секционирования не может быть пустым.
+    op.execute('UPDATE sessions_plain SET created_at = COALESCE(modified_at, expire) WHERE created_at IS NULL')
+
+    op.execute("""
+        CREATE TABLE sessions (
+            id uuid NOT NULL,
+            user_id uuid REFERENCES users (id),
+            refresh_token varchar NOT NULL,
+            refresh_jti uuid,
+            expire timestamp NOT NULL,
+            revoked_at timestamp,
+            created_at timestamp NOT NULL,
+            modified_at timestamp,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    first = op.get_bind().execute(sa.text('SELECT min(created_at) FROM sessions_plain')).scalar() or datetime.utcnow()
+    month = date(first.year, first.month, 1)
+    last = add_months(date.today().replace(day=1), MONTHS_AHEAD)
+    while month <= last:
+        op.execute(
+            f"CREATE TABLE sessions_y{month:%Y}m{month:%m} PARTITION OF sessions "
+            f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+        )
+        month = add_months(month, 1)
+    # Секции по умолчанию нет: с ней Postgres не читает секции по порядку created_at и не отсоединяет их
+    # без блокировки. Секции вперед создает cli/sessions_partitions.py при каждом старте сервиса.
+
+    op.execute(f'INSERT INTO sessions ({COLUMNS}) SELECT {COLUMNS} FROM sessions_plain')
+    op.execute('DROP TABLE sessions_plain')
+    create_indexes()
+    op.execute('ANALYZE sessions')
+
+
+def downgrade() -> None:
+    op.execute('ALTER TABLE sessions RENAME TO sessions_partitioned')
+    op.execute('ALTER INDEX ix_sessions_user_id_expire RENAME TO ix_sessions_partitioned_user_id_expire')
+    op.execute(
+        'ALTER INDEX ix_sessions_user_id_created_at_id RENAME TO ix_sessions_partitioned_user_id_created_at_id'
+    )
+    op.execute('ALTER TABLE sessions_partitioned RENAME CONSTRAINT sessions_pkey TO sessions_partitioned_pkey')
+    op.create_table(
+        'sessions',
+        sa.Column('user_id', sa.UUID(), nullable=True),
+        sa.Column('refresh_token', sa.String(), nullable=False),
+        sa.Column('expire', sa.DateTime(), nullable=False),
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('modified_at', sa.DateTime(), nullable=True),
+        sa.Column('revoked_at', sa.DateTime(), nullable=True),
+        sa.Column('refresh_jti', sa.UUID(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(f'INSERT INTO sessions ({COLUMNS}) SELECT {COLUMNS} FROM sessions_partitioned')
+    op.execute('DROP TABLE sessions_partitioned')
+    create_indexes()
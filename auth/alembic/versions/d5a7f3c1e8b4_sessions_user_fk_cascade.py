@@ -0,0 +1,28 @@
+"""Sessions user foreign key on delete cascade
+
+Revision ID: d5a7f3c1e8b4
+Revises: c41e7b2a9d35
+Create Date: 2026-10-18 21:14:02.518342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a7f3c1e8b4'
+down_revision: Union[str, None] = 'c41e7b2a9d35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Сессии удаляются вместе с пользователем, как описано в модели Session.
+    op.drop_constraint('sessions_user_id_fkey', 'sessions', type_='foreignkey')
+    op.create_foreign_key('sessions_user_id_fkey', 'sessions', 'users', ['user_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    op.drop_constraint('sessions_user_id_fkey', 'sessions', type_='foreignkey')
+    op.create_foreign_key('sessions_user_id_fkey', 'sessions', 'users', ['user_id'], ['id'])
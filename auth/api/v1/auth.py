@@ -1,22 +1,32 @@
 from typing import Annotated
 
 from async_fastapi_jwt_auth import AuthJWT
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request, Response
 from http import HTTPStatus
 
 from fastapi.security import HTTPBearer
 
 from db.redisdb import get_redis
-from schemas.user import UserId, UserProfile, UserCredentials, JWTAccessToken, \
+from schemas.error import HttpExceptionModel
+from schemas.user import UserId, UserProfile, UserCredentials, \
     RevokedSessions, NewSession, RevokedTokens, UpdatedProfileFields, UserAttributes, SessionRecord
 from services.auth import AuthService, get_auth_service
+from services.denylist import revocation_filter
 
 router = APIRouter(redirect_slashes=False, prefix="/auth", tags=['Auth'])
 
 
 @AuthJWT.token_in_denylist_loader
 async def check_if_token_in_denylist(decrypted_token):
-    return (await (await get_redis()).get(decrypted_token["jti"]) or "") == b"revoked"
+    # Подавляющее большинство токенов не отозвано, в Redis идем только при срабатывании фильтра.
+    # Запрос в Redis без фильтра (фильтр не загружен, токен старше потока) ложным срабатыванием не считается.
+    covered = revocation_filter.covers(decrypted_token)
+    if not revocation_filter.might_contain(decrypted_token):
+        return False
+    revoked = (await (await get_redis()).get(decrypted_token["jti"]) or "") == b"revoked"
+    if not revoked and covered:
+        revocation_filter.false_positive()
+    return revoked
 
 
 @router.post('/signup', status_code=HTTPStatus.CREATED)
@@ -25,10 +35,14 @@ async def create_user(request: UserProfile, auth: AuthService = Depends(get_auth
     return await auth.create_user(request)
 
 
-@router.post("/login")
-async def login(request: UserCredentials, auth: AuthService = Depends(get_auth_service)) -> NewSession:
+@router.post("/login", responses={HTTPStatus.TOO_MANY_REQUESTS: {'model': HttpExceptionModel}})
+async def login(
+        request: UserCredentials, http_request: Request, auth: AuthService = Depends(get_auth_service)
+) -> NewSession:
     """Аутентификация пользователя и создание новой сессии"""
-    return await auth.authenticate(**request.model_dump())
+    return await auth.authenticate(
+        **request.model_dump(), ip=http_request.client.host if http_request.client else None
+    )
 
 
 @router.post("/logout", dependencies=[Depends(HTTPBearer())])
@@ -38,8 +52,8 @@ async def logout(auth: AuthService = Depends(get_auth_service)) -> RevokedSessio
 
 
 @router.post("/refresh", dependencies=[Depends(HTTPBearer())])
-async def refresh(auth: AuthService = Depends(get_auth_service)) -> JWTAccessToken:
-    """Обновление токена доступа"""
+async def refresh(auth: AuthService = Depends(get_auth_service)) -> NewSession:
+    """Обновление токена доступа и ротация токена обновления"""
     return await auth.refresh_token()
 
 
@@ -70,8 +84,15 @@ async def get_profile(auth: AuthService = Depends(get_auth_service)) -> UserAttr
 
 @router.get("/history", dependencies=[Depends(HTTPBearer())])
 async def history(
+        response: Response,
         pagesize: Annotated[int, Query(description='Число сессий на страницу', examples=[100], gt=0, lt=500)] = 100,
         page: Annotated[int, Query(description='Страница', examples=[1], gt=0)] = 1,
+        cursor: Annotated[str | None, Query(
+            description='Курсор страницы из заголовка X-Next-Cursor, при указании page не учитывается'
+        )] = None,
         auth: AuthService = Depends(get_auth_service)) -> list[SessionRecord]:
-    """Получение истории входов пользователя"""
-    return await auth.get_history(pagesize=pagesize, page=page)
+    """Получение истории входов пользователя, от новых к старым"""
+    history_page = await auth.get_history(pagesize=pagesize, page=page, cursor=cursor)
+    if history_page.next_cursor:
+        response.headers['X-Next-Cursor'] = history_page.next_cursor
+    return history_page.sessions
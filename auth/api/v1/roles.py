@@ -6,7 +6,7 @@ from fastapi.security import HTTPBearer
 
 from models.permission import role_management
 from schemas.error import HttpExceptionModel
-from schemas.permission import PermissionResponse
+from schemas.permission import PermissionResponse, RolePermissionsChanged, RolePermissionsSet
 from schemas.role import RoleResponse, RoleBase
 from services.role import RoleService, get_role_service, check_access
 from services.user_role import UserRoleService, get_user_role_service
@@ -161,3 +161,25 @@ async def get_role_permissions(
         role_service: RoleService = Depends(get_role_service),
 ) -> list[PermissionResponse]:
     return await role_service.get_role_permissions(role_id)
+
+
+@router.put(
+    '/{role_id}/permissions',
+    response_model=RolePermissionsChanged,
+    summary='Замена всех доступов роли',
+    responses={
+        HTTPStatus.BAD_REQUEST: {'model': HttpExceptionModel},
+        HTTPStatus.UNAUTHORIZED: {'model': HttpExceptionModel},
+        HTTPStatus.FORBIDDEN: {'model': HttpExceptionModel},
+        HTTPStatus.NOT_FOUND: {'model': HttpExceptionModel},
+    },
+    dependencies=[Depends(HTTPBearer())]
+)
+@check_access(role_management)
+async def set_role_permissions(
+        role_id: UUID,
+        request: RolePermissionsSet,
+        user_role_service: UserRoleService = Depends(get_user_role_service),
+        role_service: RoleService = Depends(get_role_service),
+) -> RolePermissionsChanged:
+    return await role_service.set_role_permissions(role_id, request.permission_ids)
@@ -6,12 +6,31 @@ from fastapi.security import HTTPBearer
 
 from models.permission import user_management
 from schemas.error import HttpExceptionModel
+from schemas.role import UserRolesAssign, UserRolesAssigned
 from services.role import check_access
 from services.user_role import UserRoleService, get_user_role_service
 
 router = APIRouter(redirect_slashes=False, prefix="/users", tags=['Users'])
 
 
+@router.post(
+    '/roles',
+    response_model=UserRolesAssigned,
+    summary='Добавление ролей пользователям пачкой',
+    responses={
+        HTTPStatus.UNAUTHORIZED: {'model': HttpExceptionModel},
+        HTTPStatus.FORBIDDEN: {'model': HttpExceptionModel},
+    },
+    dependencies=[Depends(HTTPBearer())]
+)
+@check_access(user_management)
+async def assign_user_roles(
+        request: UserRolesAssign,
+        user_role_service: UserRoleService = Depends(get_user_role_service),
+) -> UserRolesAssigned:
+    return await user_role_service.assign_user_roles(request.user_roles)
+
+
 @router.post(
     '/{user_id}/roles/{role_id}',
     status_code=HTTPStatus.CREATED,
@@ -5,6 +5,7 @@ from sqlalchemy import select
 
 from db.postgres import async_session
 from models.user import User
+from utils.hashing import hash_password
 
 
 async def main():
@@ -28,7 +29,7 @@ async def main():
         last_name = str(input('Введите фамилию нового пользователя: '))
 
         user = User(
-            email=email, password=password, first_name=first_name,
+            email=email, password=await hash_password(password), first_name=first_name,
             last_name=last_name, login=login, superuser=True
         )
         db.add(user)
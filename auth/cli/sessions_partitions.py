@@ -0,0 +1,69 @@
+"""
+Обслуживание секций таблицы сессий.
+
+Создает месячные секции sessions на --ahead месяцев вперед. С --drop-older-than удаляет,
+а с --archive-older-than отсоединяет и переносит в схему archive секции старше указанного
+числа месяцев. Секции с неистекшими сессиями не трогаются. Запускается при старте сервиса
+и по расписанию, например раз в сутки. Секции вперед создают и воркеры сервиса раз в
+PROJECT_SESSIONS_PARTITIONS_INTERVAL секунд, см. db/partitions.py:
+
+    PYTHONPATH=. python cli/sessions_partitions.py --ahead 3 --drop-older-than 12
+"""
+import argparse
+from asyncio import run
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from core.config import project_settings
+from db.partitions import add_months, create_partitions, get_partitions
+from db.postgres import engine
+
+ARCHIVE_SCHEMA = 'archive'
+
+
+async def remove_partitions(
+        conn: AsyncConnection, partitions: dict[date, str], older_than: int, archive: bool
+) -> None:
+    # Сессии секции истекают не позже, чем через время жизни токена обновления после конца месяца.
+    expired_before = datetime.utcnow() - timedelta(seconds=project_settings.authjwt_refresh_token_expires)
+    border = min(add_months(date.today().replace(day=1), -older_than), expired_before.date())
+    if archive:
+        await conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}'))
+    for month, name in sorted(partitions.items()):
+        if add_months(month, 1) > border:
+            continue
+        # Отсоединение не блокирует запись в sessions.
+        await conn.execute(text(f'ALTER TABLE sessions DETACH PARTITION {name} CONCURRENTLY'))
+        if archive:
+            await conn.execute(text(f'ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}'))
+            print(f'Archived {name} to {ARCHIVE_SCHEMA}.{name}')
+        else:
+            await conn.execute(text(f'DROP TABLE {name}'))
+            print(f'Dropped {name}')
+
+
+async def main(args: argparse.Namespace) -> None:
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+        for name in await create_partitions(conn, args.ahead):
+            print(f'Created {name}')
+        partitions = await get_partitions(conn)
+        if args.drop_older_than is not None:
+            await remove_partitions(conn, partitions, args.drop_older_than, archive=False)
+        elif args.archive_older_than is not None:
+            await remove_partitions(conn, partitions, args.archive_older_than, archive=True)
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Обслуживание секций таблицы сессий')
+    parser.add_argument('--ahead', type=int, default=3, help='На сколько месяцев вперед создать секции')
+    removal = parser.add_mutually_exclusive_group()
+    removal.add_argument('--drop-older-than', type=int, metavar='MONTHS', help='Удалить секции старше MONTHS месяцев')
+    removal.add_argument(
+        '--archive-older-than', type=int, metavar='MONTHS',
+        help=f'Перенести в схему {ARCHIVE_SCHEMA} секции старше MONTHS месяцев'
+    )
+    run(main(parser.parse_args()))
@@ -0,0 +1,257 @@
+"""
+Массовый импорт пользователей из CSV или NDJSON.
+
+Поля записи: login, first_name, last_name, email (необязательно), password или уже
+готовый password_hash в формате werkzeug, superuser, roles - имена существующих ролей
+(в CSV через ";"). Записи читаются потоком и загружаются пачками по --chunk-size:
+пароли пачки хэшируются в пуле процессов, пока загружается предыдущая, пользователи
+копируются (COPY) во временную таблицу и переносятся в users одним INSERT ... ON CONFLICT,
+роли копируются прямо в user_roles. Каждая пачка - одна транзакция, после нее номер
+последней записи пишется в файл контрольной точки, и повторный запуск продолжает с него.
+Идентификатор пользователя выводится из логина, поэтому пачка, загруженная, но не
+отмеченная в контрольной точке, при повторе пропускается (как и повтор логина в следующих
+пачках). Отклоненные записи с причиной, в том числе строки NDJSON, которые не разбираются
+как объект JSON, пишутся в CSV-отчет об ошибках. Размер отчета тоже хранится в контрольной
+точке: при повторе отчет обрезается до него, и ошибки неотмеченной пачки не дублируются.
+
+    PYTHONPATH=. python cli/users_import.py users.csv
+    PYTHONPATH=. python cli/users_import.py users.ndjson --chunk-size 20000 --workers 8
+"""
+import argparse
+import asyncio
+import csv
+import datetime
+import json
+import os
+import time
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import islice
+from multiprocessing import get_context
+from typing import Any, Iterator
+
+from pydantic import EmailStr, ValidationError
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from werkzeug.security import generate_password_hash
+
+from core.config import hashing_settings
+from db.postgres import engine
+from models.user import User
+from schemas.user import UserAttributes
+from utils.cpu import available_cpus
+
+# Пространство имен идентификаторов импортированных пользователей: uuid5 от логина.
+USER_ID_NAMESPACE = uuid.UUID('8a5d7c1e-3b0f-4f6e-9c2a-6d1e4b7f0a93')
+USER_COLUMNS = ('id', 'login', 'password', 'first_name', 'last_name', 'email', 'superuser', 'created_at', 'modified_at')
+USER_ROLE_COLUMNS = ('id', 'user_id', 'role_id', 'created_at', 'modified_at')
+# Ограничения длины столбцов users: COPY отклонил бы всю пачку из-за одной длинной строки.
+MAX_LENGTHS = {name: User.__table__.c[name].type.length for name in ('login', 'first_name', 'last_name', 'email')}
+
+
+class ImportedUser(UserAttributes):
+    email: EmailStr | None = None
+    password: str | None = None
+    password_hash: str | None = None
+    superuser: bool = False
+    roles: list[str] = []
+
+
+class Chunk:
+    """Пачка записей: проверенные пользователи и отклоненные записи с причиной."""
+
+    def __init__(self, last_row: int) -> None:
+        self.last_row = last_row
+        self.users: list[tuple[int, ImportedUser]] = []
+        self.errors: list[tuple[int, str, str]] = []
+
+
+def read_records(path: str) -> Iterator[Any]:
+    """Записи файла по порядку. Вместо строки NDJSON, которая не разбирается, - ValueError с причиной."""
+    with open(path, newline='', encoding='utf-8') as file:
+        if path.endswith(('.ndjson', '.jsonl')):
+            for line in file:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as e:
+                        yield ValueError(f'invalid JSON: {e}')
+        else:
+            for record in csv.DictReader(file):
+                record['roles'] = [role for role in (record.get('roles') or '').split(';') if role]
+                yield {key: value for key, value in record.items() if value != '' or key == 'roles'}
+
+
+def hash_passwords(passwords: list[str]) -> list[str]:
+    # Выполняется в процессе пула.
+    return [
+        generate_password_hash(password, method=hashing_settings.get_method(), salt_length=hashing_settings.salt_length)
+        for password in passwords
+    ]
+
+
+def validate(record: Any, roles: dict[str, uuid.UUID]) -> ImportedUser:
+    if isinstance(record, ValueError):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError(f'record is not an object: {type(record).__name__}')
+    user = ImportedUser.model_validate(record)
+    for name, length in MAX_LENGTHS.items():
+        if len(getattr(user, name) or '') > length:
+            raise ValueError(f'{name} is longer than {length} characters')
+    if user.password_hash is None and not user.password:
+        raise ValueError('password or password_hash is required')
+    if user.password_hash is not None and user.password_hash.count('$') != 2:
+        raise ValueError('password_hash is not a werkzeug hash')
+    if unknown := [role for role in user.roles if role not in roles]:
+        raise ValueError(f'unknown roles: {", ".join(unknown)}')
+    return user
+
+
+def record_login(record: Any) -> str:
+    return str(record.get('login', '')) if isinstance(record, dict) else ''
+
+
+async def prepare(
+        records: list[tuple[int, Any]], roles: dict[str, uuid.UUID], executor: Executor, workers: int
+) -> Chunk:
+    chunk = Chunk(records[-1][0])
+    logins = set()
+    for row, record in records:
+        try:
+            user = validate(record, roles)
+            if user.login in logins:
+                raise ValueError('duplicate login in the same chunk')
+            logins.add(user.login)
+            chunk.users.append((row, user))
+        except ValidationError as e:
+            reason = '; '.join(f'{".".join(map(str, error["loc"]))}: {error["msg"]}' for error in e.errors())
+            chunk.errors.append((row, record_login(record), reason))
+        except ValueError as e:
+            chunk.errors.append((row, record_login(record), str(e)))
+
+    pending = [user for _, user in chunk.users if user.password_hash is None]
+    if pending:
+        # Пароли делятся на части по числу процессов пула.
+        size = -(-len(pending) // workers)
+        loop = asyncio.get_running_loop()
+        parts = await asyncio.gather(*(
+            loop.run_in_executor(executor, hash_passwords, [user.password for user in pending[i:i + size]])
+            for i in range(0, len(pending), size)
+        ))
+        for user, password_hash in zip(pending, (password_hash for part in parts for password_hash in part)):
+            user.password_hash = password_hash
+    return chunk
+
+
+async def load(conn: AsyncConnection, chunk: Chunk, roles: dict[str, uuid.UUID]) -> tuple[int, int]:
+    """Загружает пачку одной транзакцией. Возвращает число добавленных и уже загруженных ранее пользователей."""
+    now = datetime.datetime.utcnow()
+    users = {uuid.uuid5(USER_ID_NAMESPACE, user.login): (row, user) for row, user in chunk.users}
+    async with conn.begin():
+        cursor = (await conn.get_raw_connection()).driver_connection.cursor()
+        async with cursor.copy(f'COPY users_import ({", ".join(USER_COLUMNS)}) FROM STDIN') as copy:
+            for user_id, (_, user) in users.items():
+                await copy.write_row((
+                    user_id, user.login, user.password_hash, user.first_name, user.last_name, user.email,
+                    user.superuser, now, now,
+                ))
+        inserted = set((await conn.execute(text(
+            f'INSERT INTO users ({", ".join(USER_COLUMNS)}) SELECT {", ".join(USER_COLUMNS)} FROM users_import '
+            'ON CONFLICT DO NOTHING RETURNING id'
+        ))).scalars())
+        rejected = [user_id for user_id in users if user_id not in inserted]
+        # Пользователи с тем же идентификатором загружены прошлым запуском, остальные заняли логин или email.
+        loaded = set((await conn.execute(
+            text('SELECT id FROM users WHERE id = ANY(:ids)'), {'ids': rejected}
+        )).scalars()) if rejected else set()
+        for user_id in rejected:
+            if user_id not in loaded:
+                row, user = users[user_id]
+                chunk.errors.append((row, user.login, 'login or email already exists'))
+
+        async with cursor.copy(f'COPY user_roles ({", ".join(USER_ROLE_COLUMNS)}) FROM STDIN') as copy:
+            for user_id in inserted:
+                for role in set(users[user_id][1].roles):
+                    await copy.write_row((uuid.uuid4(), user_id, roles[role], now, now))
+        await cursor.close()
+    return len(inserted), len(loaded)
+
+
+def save_checkpoint(path: str, state: dict) -> None:
+    with open(f'{path}.tmp', 'w') as file:
+        json.dump(state, file)
+    os.replace(f'{path}.tmp', path)
+
+
+async def main(args: argparse.Namespace) -> None:
+    checkpoint = args.checkpoint or f'{args.input}.checkpoint'
+    errors_path = args.errors or f'{args.input}.errors.csv'
+    state = {'rows': 0, 'imported': 0, 'skipped': 0, 'failed': 0, 'errors_size': 0}
+    if os.path.exists(checkpoint) and not args.restart:
+        with open(checkpoint) as file:
+            state = json.load(file)
+        print(f'Resuming after row {state["rows"]}')
+        # Ошибки пачки, записанные после контрольной точки, будут записаны повторно.
+        if os.path.exists(errors_path) and 'errors_size' in state:
+            os.truncate(errors_path, state['errors_size'])
+
+    workers = args.workers or available_cpus()
+    records = enumerate(read_records(args.input), start=1)
+    records = islice(records, state['rows'], None)
+    started = time.perf_counter()
+    imported = 0
+
+    async with engine.connect() as conn:
+        roles = dict((await conn.execute(text('SELECT name, id FROM roles'))).all())
+        await conn.execute(text(
+            'CREATE TEMP TABLE users_import (LIKE users INCLUDING DEFAULTS) ON COMMIT DELETE ROWS'
+        ))
+        await conn.commit()
+
+        # spawn: процессы пула не наследуют соединение с Postgres.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn')) as executor, \
+                open(errors_path, 'a' if state['rows'] else 'w', newline='') as errors_file:
+            errors = csv.writer(errors_file)
+            if not state['rows']:
+                errors.writerow(('row', 'login', 'error'))
+
+            def next_chunk() -> asyncio.Task | None:
+                if batch := list(islice(records, args.chunk_size)):
+                    return asyncio.create_task(prepare(batch, roles, executor, workers))
+
+            # Следующая пачка читается и хэшируется, пока загружается текущая.
+            pending = next_chunk()
+            while pending:
+                chunk = await pending
+                pending = next_chunk()
+                inserted, skipped = await load(conn, chunk, roles)
+                errors.writerows(sorted(chunk.errors))
+                errors_file.flush()
+                imported += inserted
+                state = {
+                    'rows': chunk.last_row,
+                    'imported': state['imported'] + inserted,
+                    'skipped': state['skipped'] + skipped,
+                    'failed': state['failed'] + len(chunk.errors),
+                    'errors_size': os.fstat(errors_file.fileno()).st_size,
+                }
+                save_checkpoint(checkpoint, state)
+                rate = imported / (time.perf_counter() - started) * 60
+                print(
+                    f'row {state["rows"]}: imported {state["imported"]}, already loaded {state["skipped"]}, '
+                    f'failed {state["failed"]}, {rate:.0f} users/min'
+                )
+    await engine.dispose()
+    print(f'Done. Errors are in {errors_path}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Массовый импорт пользователей из CSV или NDJSON')
+    parser.add_argument('input', help='Файл .csv с заголовком или .ndjson/.jsonl')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='Записей в пачке (одна транзакция)')
+    parser.add_argument('--workers', type=int, help='Процессов хэширования, по умолчанию по числу ядер')
+    parser.add_argument('--checkpoint', help='Файл контрольной точки, по умолчанию <input>.checkpoint')
+    parser.add_argument('--errors', help='Отчет об отклоненных записях, по умолчанию <input>.errors.csv')
+    parser.add_argument('--restart', action='store_true', help='Начать сначала, не учитывая контрольную точку')
+    asyncio.run(main(parser.parse_args()))
@@ -2,6 +2,7 @@ from datetime import timedelta
 from logging import config as logging_config
 
 from core.logger import LOGGING
+from utils.cpu import available_cpus
 from pydantic import Field
 from pydantic_settings import SettingsConfigDict, BaseSettings
 
@@ -13,10 +14,38 @@ class ProjectSettings(BaseSettings):
     # TODO: Вынести в настройки.
     name: str = Field('Auth Service')
     authjwt_secret_key: str = "secret"
+    # HS256 - подпись общим секретом. RS256 или EdDSA - подпись ключами из jwt_keys_dir, см. services/jwt_keys.py.
+    authjwt_algorithm: str = "HS256"
+    jwt_keys_dir: str | None = Field(None)
+    jwt_signing_kid: str | None = Field(None)
+    # Время кэширования /.well-known/jwks.json клиентами, сек.
+    jwks_max_age: int = Field(300)
     authjwt_access_token_expires: int = timedelta(minutes=30).total_seconds()
     authjwt_refresh_token_expires: int = timedelta(hours=24).total_seconds()
     authjwt_denylist_enabled: bool = True
     authjwt_denylist_token_checks: set = {"access", "refresh"}
+    # Время жизни записей кэша доступов ролей в памяти воркера, сек.
+    permission_cache_ttl: int = Field(60)
+    # Класть в access-токен битовую маску доступов и версию доступов, чтобы проверять доступ без запросов.
+    permissions_in_token: bool = Field(False)
+    # Фильтр Блума отозванных токенов: емкость корзины, доля ложных срабатываний и ширина корзины, сек.
+    denylist_filter_capacity: int = Field(100000)
+    denylist_filter_error_rate: float = Field(0.001)
+    denylist_filter_bucket: int = Field(3600)
+    # Отложенная запись сессий в Postgres через поток Redis: размер пачки, предельная длина потока,
+    # после которой вход пишет в Postgres сам, и простой, после которого записи пропавшего воркера забирают, мс.
+    session_journal: bool = Field(False)
+    session_journal_batch: int = Field(500)
+    session_journal_max_length: int = Field(100000)
+    session_journal_claim_idle: int = Field(60000)
+    # Сколько месяцев вперед создаются секции сессий и как часто воркер проверяет их, сек.
+    sessions_partitions_ahead: int = Field(3)
+    sessions_partitions_interval: int = Field(3600)
+    # Ограничение частоты входов скользящим окном: попыток за окно (сек.) на логин и на адрес клиента.
+    login_throttle: bool = Field(True)
+    login_throttle_window: int = Field(60)
+    login_throttle_login_limit: int = Field(10)
+    login_throttle_ip_limit: int = Field(100)
 
     model_config = SettingsConfigDict(env_prefix='project_', env_file='.env')
 
@@ -28,8 +57,17 @@ class PostgresSettings(BaseSettings):
     password: str = ...
     host: str = Field('localhost')
     port: int = Field(5432)
-    echo: bool = Field(True)
+    echo: bool = Field(False)
     dbschema: str = Field('public')
+    # Пул соединений воркера.
+    pool_size: int = Field(10)
+    max_overflow: int = Field(10)
+    pool_timeout: float = Field(30)
+    pool_recycle: int = Field(1800)
+    pool_pre_ping: bool = Field(True)
+    # Кэш скомпилированных запросов SQLAlchemy и порог подготовки запросов на сервере psycopg.
+    query_cache_size: int = Field(500)
+    prepare_threshold: int | None = Field(5)
 
     model_config = SettingsConfigDict(env_prefix='postgres_', env_file='.env')
 
@@ -39,7 +77,16 @@ class PostgresSettings(BaseSettings):
     def get_connection_info(self):
         return {
             'url': self.get_dsn(),
-            'connect_args': {'options': f"-c search_path={self.dbschema},public"}
+            'connect_args': {
+                'options': f"-c search_path={self.dbschema},public",
+                'prepare_threshold': self.prepare_threshold,
+            },
+            'pool_size': self.pool_size,
+            'max_overflow': self.max_overflow,
+            'pool_timeout': self.pool_timeout,
+            'pool_recycle': self.pool_recycle,
+            'pool_pre_ping': self.pool_pre_ping,
+            'query_cache_size': self.query_cache_size,
         }
 
 
@@ -51,16 +98,67 @@ class RedisSettings(BaseSettings):
     model_config = SettingsConfigDict(env_prefix='redis_', env_file='.env')
 
 
+# Класс настройки хэширования паролей
+class HashingSettings(BaseSettings):
+    # Алгоритм werkzeug: pbkdf2:sha256, pbkdf2:sha512 или scrypt.
+    algorithm: str = Field('scrypt')
+    # Стоимость алгоритма: число итераций для pbkdf2 или n:r:p для scrypt.
+    cost: str = Field('32768:8:1')
+    salt_length: int = Field(16)
+    # Пул для хэширования: thread (hashlib отпускает GIL) или process.
+    executor: str = Field('thread')
+    # Размер пула, по умолчанию по числу ядер, доступных контейнеру (affinity и квота cgroup).
+    workers: int | None = Field(None)
+
+    model_config = SettingsConfigDict(env_prefix='hashing_', env_file='.env')
+
+    def get_method(self) -> str:
+        return f'{self.algorithm}:{self.cost}' if self.cost else self.algorithm
+
+
 # Класс настройки Elasticsearch
 class GunicornSettings(BaseSettings):
     host: str = Field('0.0.0.0')
     port: int = Field(8000)
-    workers: int = Field(2)
+    # Число воркеров, по умолчанию по числу доступных ядер, но не больше workers_max: у каждого воркера
+    # свой пул до POSTGRES_POOL_SIZE + POSTGRES_MAX_OVERFLOW соединений, а max_connections Postgres - 100.
+    workers: int | None = Field(None)
+    workers_max: int = Field(4)
+    # UvicornWorker - uvloop и httptools, UvicornH11Worker - asyncio и парсер HTTP на чистом Python.
+    worker_class: str = Field('uvicorn.workers.UvicornWorker')
+    # Сколько секунд держать открытым соединение между запросами.
+    keepalive: int = Field(5)
+    # Перезапуск воркера после max_requests + random(0, max_requests_jitter) запросов; 0 - без перезапуска.
+    max_requests: int = Field(0)
+    max_requests_jitter: int = Field(0)
+    # Загрузить приложение в мастере до fork: воркеры стартуют быстрее и делят память с мастером.
+    preload_app: bool = Field(False)
+    # Адреса прокси через запятую, которым доверяется X-Forwarded-For: адрес клиента берется из заголовка
+    # только в запросах с этих адресов. В docker-compose.yml - адрес nginx, "*" позволил бы любому
+    # клиенту подставить чужой адрес и обойти ограничение входов по адресу.
+    forwarded_allow_ips: str = Field('127.0.0.1')
     loglevel: str = Field('debug')
     model_config = SettingsConfigDict(env_prefix='gunicorn_', env_file='.env')
 
+    def get_workers(self) -> int:
+        return self.workers or min(available_cpus(), self.workers_max)
+
+
+class LoggingSettings(BaseSettings):
+    # Запись логов отдельным потоком через очередь, чтобы вывод не блокировал цикл событий.
+    queue: bool = Field(True)
+    # Формат строк: text или json.
+    format: str = Field('text')
+    # Доля записей, которые пишутся, по логгерам, например {"gunicorn.access": 0.1}.
+    # Предупреждения и ошибки пишутся все.
+    sample_rates: dict[str, float] = Field({})
+
+    model_config = SettingsConfigDict(env_prefix='log_', env_file='.env')
+
 
 project_settings = ProjectSettings()
 redis_settings = RedisSettings()
 postgres_settings = PostgresSettings()
+hashing_settings = HashingSettings()
 gunicorn_settings = GunicornSettings()
+logging_settings = LoggingSettings()
@@ -1,3 +1,10 @@
+import copy
+import json
+import logging
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+
 # noinspection SpellCheckingInspection
 LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 LOG_DEFAULT_HANDLERS = ['console', ]
@@ -62,3 +69,103 @@ LOGGING = {
         'handlers': LOG_DEFAULT_HANDLERS,
     },
 }
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись лога одной строкой JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'process': record.process,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает долю rate записей логгера, ошибки пропускаются всегда."""
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler, оставляющий оформление записи потоку записи.
+
+    Стандартный prepare() форматирует запись, вместе с трассировкой исключения, в вызывающем
+    потоке, то есть в цикле событий. Здесь в нем только подставляются аргументы сообщения,
+    которые могут измениться, пока запись ждет в очереди.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        return record
+
+
+_listeners: list[QueueListener] = []
+_replaced: list[tuple[logging.Logger, list[logging.Handler]]] = []
+_filters: list[tuple[logging.Logger, SamplingFilter]] = []
+
+
+def start_logging(
+        json_format: bool = False, sample_rates: dict[str, float] | None = None, use_queue: bool = True
+) -> None:
+    """
+    Переводит обработчики настроенных логгеров на очередь с потоком записи.
+
+    Вызывается в каждом процессе после dictConfig и fork: поток записи не переживает fork.
+    Логгеры с общим набором обработчиков (uvicorn.access и gunicorn.access) делят очередь.
+    Выборка sample_rates ставится фильтром на логгер, поэтому отброшенные записи не попадают в очередь.
+    """
+    for name, rate in (sample_rates or {}).items():
+        # Фильтр логгера видит только записи, сделанные прямо в нем, без дочерних логгеров.
+        logger, sampling = logging.getLogger(name), SamplingFilter(rate)
+        logger.addFilter(sampling)
+        _filters.append((logger, sampling))
+
+    loggers = [logging.getLogger()] + [
+        logger for logger in logging.root.manager.loggerDict.values()
+        if isinstance(logger, logging.Logger) and logger.handlers
+    ]
+    queues: dict[tuple[int, ...], QueueHandler] = {}
+    for logger in loggers:
+        handlers = [handler for handler in logger.handlers if not isinstance(handler, QueueHandler)]
+        if not handlers:
+            continue
+        if json_format:
+            for handler in handlers:
+                handler.setFormatter(JsonFormatter())
+        if not use_queue:
+            continue
+        key = tuple(map(id, handlers))
+        if key not in queues:
+            queues[key] = DeferredQueueHandler(queue.SimpleQueue())
+            listener = QueueListener(queues[key].queue, *handlers, respect_handler_level=True)
+            listener.start()
+            _listeners.append(listener)
+        _replaced.append((logger, logger.handlers[:]))
+        logger.handlers = [queues[key]]
+
+
+def stop_logging() -> None:
+    """Дописывает очереди и возвращает логгерам их обработчики и снимает выборку."""
+    for listener in _listeners:
+        listener.stop()
+    _listeners.clear()
+    for logger, handlers in _replaced:
+        logger.handlers = handlers
+    _replaced.clear()
+    for logger, sampling in _filters:
+        logger.removeFilter(sampling)
+    _filters.clear()
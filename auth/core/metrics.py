@@ -0,0 +1,190 @@
+import inspect
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Фильтр отозванных токенов перед Redis.
+DENYLIST_FILTER_LOOKUPS = Counter(
+    'denylist_filter_lookups_total', 'Проверки токена по локальному фильтру отозванных токенов'
+)
+DENYLIST_FILTER_HITS = Counter(
+    'denylist_filter_hits_total', 'Проверки, для которых фильтр потребовал запрос в Redis'
+)
+DENYLIST_FILTER_FALSE_POSITIVES = Counter(
+    'denylist_filter_false_positives_total', 'Срабатывания фильтра на неотозванный токен'
+)
+# Фильтр есть в каждом воркере: вероятность, число записей и время загрузки - по худшему воркеру, память - сумма.
+DENYLIST_FILTER_FALSE_POSITIVE_RATE = Gauge(
+    'denylist_filter_false_positive_rate', 'Расчетная вероятность ложного срабатывания фильтра',
+    multiprocess_mode='livemax',
+)
+DENYLIST_FILTER_MEMORY = Gauge(
+    'denylist_filter_memory_bytes', 'Память, занятая фильтром отозванных токенов', multiprocess_mode='livesum',
+)
+DENYLIST_FILTER_ENTRIES = Gauge(
+    'denylist_filter_entries', 'Число неистекших отозванных токенов в фильтре', multiprocess_mode='livemax',
+)
+DENYLIST_FILTER_LOAD_DURATION = Gauge(
+    'denylist_filter_load_seconds', 'Время последней загрузки фильтра отозванных токенов из потока отзывов',
+    multiprocess_mode='livemax',
+)
+
+# Ограничение частоты входов.
+LOGIN_THROTTLE_REJECTIONS = Counter(
+    'login_throttle_rejections_total', 'Попытки входа, отклоненные до проверки пароля', ['key'],
+)
+
+# Пул соединений Postgres.
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    'db_pool_checkout_wait_seconds', 'Ожидание соединения из пула Postgres',
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30),
+)
+# У каждого воркера свой пул: выданные соединения суммируются, заполнение - по самому занятому пулу.
+DB_POOL_CHECKED_OUT = Gauge(
+    'db_pool_checked_out', 'Соединения Postgres, выданные из пула', multiprocess_mode='livesum',
+)
+DB_POOL_SATURATION = Gauge(
+    'db_pool_saturation', 'Доля занятых соединений от pool_size + max_overflow', multiprocess_mode='livemax',
+)
+
+# Запросы к сервису и время, проведенное в Postgres, Redis, хэшировании пароля и JWT.
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Время обработки запроса', ['method', 'route', 'status'],
+)
+REQUEST_STAGE_DURATION = Histogram(
+    'http_request_stage_duration_seconds', 'Время запроса по этапам: db, redis, hashing, jwt', ['route', 'stage'],
+)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 7, 10, 15, 20, 30, 50)
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries', 'Число запросов к Postgres за запрос', ['route'], buckets=COUNT_BUCKETS,
+)
+REQUEST_REDIS_COMMANDS = Histogram(
+    'http_request_redis_commands', 'Число команд и пайплайнов Redis за запрос', ['route'], buckets=COUNT_BUCKETS,
+)
+SERVICE_DURATION = Histogram(
+    'service_method_duration_seconds', 'Время метода сервиса', ['service', 'method'],
+)
+DB_QUERY_DURATION = Histogram(
+    'db_query_duration_seconds', 'Время запроса к Postgres', ['statement'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10),
+)
+REDIS_COMMAND_DURATION = Histogram(
+    'redis_command_duration_seconds', 'Время команды или пайплайна Redis', ['command'],
+    buckets=(.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1),
+)
+PASSWORD_HASH_DURATION = Histogram(
+    'password_hash_duration_seconds', 'Хэширование и проверка пароля вместе с ожиданием пула', ['operation'],
+    buckets=(.005, .01, .025, .05, .075, .1, .15, .2, .3, .5, .75, 1, 2.5, 5),
+)
+JWT_DURATION = Histogram(
+    'jwt_duration_seconds', 'Подпись и проверка JWT', ['operation'],
+    buckets=(.00005, .0001, .00025, .0005, .001, .0025, .005, .01, .025, .05),
+)
+
+STAGES = ('db', 'redis', 'hashing', 'jwt')
+
+
+def get_registry() -> CollectorRegistry:
+    """
+    Реестр для /metrics.
+
+    Под gunicorn каждый воркер пишет метрики в файлы каталога PROMETHEUS_MULTIPROC_DIR
+    (задается в start_auth.sh до импорта prometheus_client), и любой воркер отдает их сумму
+    по всем воркерам. Без каталога - метрики текущего процесса.
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+class RequestStages:
+    """Число обращений и время по этапам текущего запроса."""
+
+    __slots__ = ('calls', 'seconds')
+
+    def __init__(self) -> None:
+        self.calls = dict.fromkeys(STAGES, 0)
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+
+
+# Этапы запроса, который обрабатывается в текущем контексте; None вне запроса (фоновые задачи, старт).
+request_stages: ContextVar[RequestStages | None] = ContextVar('request_stages', default=None)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    stages = request_stages.get()
+    if stages is not None:
+        stages.calls[stage] += 1
+        stages.seconds[stage] += seconds
+
+
+@contextmanager
+def measure(histogram: Histogram, stage: str):
+    """Замеряет блок в гистограмму и добавляет его время к этапу текущего запроса."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        histogram.observe(elapsed)
+        observe_stage(stage, elapsed)
+
+
+def metered(cls):
+    """Декоратор класса сервиса: замеряет время его публичных асинхронных методов."""
+    def wrap(name, method):
+        histogram = SERVICE_DURATION.labels(cls.__name__, name)
+
+        @wraps(method)
+        async def wrapper(*args, **kwargs):
+            with histogram.time():
+                return await method(*args, **kwargs)
+        return wrapper
+
+    for name, method in list(vars(cls).items()):
+        if not name.startswith('_') and inspect.iscoroutinefunction(method):
+            setattr(cls, name, wrap(name, method))
+    return cls
+
+
+class MetricsMiddleware:
+    """Время запроса по шаблону маршрута и его разбивка по этапам."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        stages = RequestStages()
+        token = request_stages.set(stages)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            request_stages.reset(token)
+            # Шаблон пути маршрута FastAPI, а не сам путь: число меток не зависит от идентификаторов в URL.
+            route = getattr(scope.get('route'), 'path', 'unmatched')
+            REQUEST_DURATION.labels(scope['method'], route, status).observe(elapsed)
+            for stage in STAGES:
+                REQUEST_STAGE_DURATION.labels(route, stage).observe(stages.seconds[stage])
+            REQUEST_DB_QUERIES.labels(route).observe(stages.calls['db'])
+            REQUEST_REDIS_COMMANDS.labels(route).observe(stages.calls['redis'])
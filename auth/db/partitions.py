@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import re
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from db.postgres import engine
+
+logger = logging.getLogger(__name__)
+
+PARTITION_NAME = re.compile(r'^sessions_y(\d{4})m(\d{2})$')
+# Ключ advisory-блокировки, под которой создаются секции: воркеры делают это одновременно.
+PARTITIONS_LOCK_KEY = 6_000_016
+
+
+def add_months(month: date, months: int) -> date:
+    month_index = month.year * 12 + month.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f'sessions_y{month:%Y}m{month:%m}'
+
+
+async def get_partitions(conn: AsyncConnection) -> dict[date, str]:
+    names = (await conn.execute(text("""
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = 'sessions' AND parent.relnamespace = current_schema()::regnamespace
+    """))).scalars().all()
+    partitions = {}
+    for name in names:
+        if match := PARTITION_NAME.match(name):
+            partitions[date(int(match[1]), int(match[2]), 1)] = name
+    return partitions
+
+
+async def create_partitions(conn: AsyncConnection, ahead: int) -> list[str]:
+    """Создает недостающие месячные секции sessions с текущего месяца на ahead месяцев вперед."""
+    created = []
+    await conn.execute(text('SELECT pg_advisory_lock(:key)'), {'key': PARTITIONS_LOCK_KEY})
+    try:
+        partitions = await get_partitions(conn)
+        current = date.today().replace(day=1)
+        for month in (add_months(current, i) for i in range(ahead + 1)):
+            if month in partitions:
+                continue
+            await conn.execute(text(
+                f"CREATE TABLE {partition_name(month)} PARTITION OF sessions "
+                f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+            ))
+            created.append(partition_name(month))
+    finally:
+        await conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': PARTITIONS_LOCK_KEY})
+    return created
+
+
+async def keep_partitions(ahead: int, interval: int) -> None:
+    """
+    Создает секции вперед при старте воркера и затем каждые interval секунд.
+
+    Секции по умолчанию нет, и без секции на текущий месяц вход и журнал сессий не смогут
+    записать сессию, поэтому секции создает и долго работающий сервис, а не только старт.
+    """
+    while True:
+        try:
+            async with engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+                for name in await create_partitions(conn, ahead):
+                    logger.info('Created sessions partition %s', name)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception('Failed to create sessions partitions')
+        await asyncio.sleep(interval)
@@ -1,17 +1,68 @@
+import time
+
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from core.config import postgres_settings
+from core.metrics import (
+    DB_POOL_CHECKED_OUT, DB_POOL_CHECKOUT_WAIT, DB_POOL_SATURATION, DB_QUERY_DURATION, observe_stage,
+)
 
 Base = declarative_base()
 
+
+class MeteredQueuePool(AsyncAdaptedQueuePool):
+    """Пул, замеряющий ожидание свободного соединения."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+
 engine = create_async_engine(
-    **postgres_settings.get_connection_info(), echo=postgres_settings.echo, future=True
+    **postgres_settings.get_connection_info(), echo=postgres_settings.echo, future=True, poolclass=MeteredQueuePool
 )
 async_session = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
+# Выданные соединения считаются по событиям пула: в режиме нескольких процессов
+# Prometheus не вызывает функции при сборе метрик, значения пишутся в файлы воркера.
+checked_out = 0
+
+
+@event.listens_for(engine.sync_engine, 'checkout')
+def on_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+    global checked_out
+    checked_out += 1
+    DB_POOL_CHECKED_OUT.set(checked_out)
+    DB_POOL_SATURATION.set(checked_out / (postgres_settings.pool_size + postgres_settings.max_overflow))
+
+
+@event.listens_for(engine.sync_engine, 'checkin')
+def on_checkin(dbapi_connection, connection_record) -> None:
+    global checked_out
+    checked_out = max(checked_out - 1, 0)
+    DB_POOL_CHECKED_OUT.set(checked_out)
+    DB_POOL_SATURATION.set(checked_out / (postgres_settings.pool_size + postgres_settings.max_overflow))
+
+
+@event.listens_for(engine.sync_engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info['query_started'] = time.perf_counter()
+
+
+@event.listens_for(engine.sync_engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    elapsed = time.perf_counter() - conn.info.pop('query_started')
+    DB_QUERY_DURATION.labels(statement.lstrip().split(None, 1)[0].upper()).observe(elapsed)
+    observe_stage('db', elapsed)
+
 
 async def get_session() -> AsyncSession:
     async with async_session() as session:
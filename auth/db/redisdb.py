@@ -1,5 +1,25 @@
 from typing import Optional
 from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+from core.metrics import REDIS_COMMAND_DURATION, measure
+
+
+class MeteredPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        with measure(REDIS_COMMAND_DURATION.labels('PIPELINE'), 'redis'):
+            return await super().execute(raise_on_error)
+
+
+class MeteredRedis(Redis):
+    """Клиент Redis, замеряющий команды и пайплайны."""
+
+    async def execute_command(self, *args, **options):
+        with measure(REDIS_COMMAND_DURATION.labels(str(args[0]).upper()), 'redis'):
+            return await super().execute_command(*args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> MeteredPipeline:
+        return MeteredPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
 
 
 redis: Optional[Redis] = None
@@ -1,8 +1,42 @@
+import asyncio
+import json
+import os
+
+from prometheus_client import multiprocess
+
 from core.config import gunicorn_settings
 from core.logger import LOGGING
+from db.postgres import engine
+from models.permission import permissions
+from utils.db_utils import PERMISSION_IDS_ENV, seed_permissions
 
 bind = f'{gunicorn_settings.host}:{gunicorn_settings.port}'
-workers = gunicorn_settings.workers
+workers = gunicorn_settings.get_workers()
+worker_class = gunicorn_settings.worker_class
+keepalive = gunicorn_settings.keepalive
+max_requests = gunicorn_settings.max_requests
+max_requests_jitter = gunicorn_settings.max_requests_jitter
+preload_app = gunicorn_settings.preload_app
+forwarded_allow_ips = gunicorn_settings.forwarded_allow_ips
 logconfig_dict = LOGGING
 loglevel = gunicorn_settings.loglevel
-worker_class = 'uvicorn.workers.UvicornH11Worker'
+
+
+async def _seed_permissions() -> dict[str, str]:
+    try:
+        ids = await seed_permissions([permission.name for permission in permissions])
+    finally:
+        # Соединения мастера не должны достаться воркерам после fork.
+        await engine.dispose()
+    return {name: str(permission_id) for name, permission_id in ids.items()}
+
+
+def child_exit(server, worker) -> None:
+    # Значения livesum и livemax завершившегося воркера больше не учитываются.
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def on_starting(server) -> None:
+    # Доступы создаются один раз до запуска воркеров, воркеры наследуют их идентификаторы через окружение.
+    os.environ[PERMISSION_IDS_ENV] = json.dumps(asyncio.run(_seed_permissions()))
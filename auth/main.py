@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
@@ -6,34 +7,68 @@ from async_fastapi_jwt_auth import AuthJWT
 from async_fastapi_jwt_auth.exceptions import AuthJWTException
 from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
+from prometheus_client import make_asgi_app
 from starlette.requests import Request
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, Response
 
 from api.v1 import auth, users, roles
-from redis.asyncio import Redis
 
-from core.config import project_settings, redis_settings
-from core.logger import LOGGING
+from core.config import logging_settings, project_settings, redis_settings
+from core.logger import LOGGING, start_logging, stop_logging
+from core.metrics import MetricsMiddleware, get_registry
 from utils.db_utils import create_permissions
+from utils.hashing import shutdown_executor
 from db import redisdb as redis
+from db.partitions import keep_partitions
+from db.redisdb import MeteredRedis
+from services.denylist import revocation_filter
+from services.jwt_keys import key_ring
+from services.permission_cache import permission_cache
+from services.session_journal import session_journal
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
+    # Пишем логи воркера отдельным потоком.
+    start_logging(logging_settings.format == 'json', logging_settings.sample_rates, logging_settings.queue)
+
     # Создаем подключение к базам при старте сервера.
-    redis.redis = Redis(**redis_settings.model_dump())
+    redis.redis = MeteredRedis(**redis_settings.model_dump())
 
     # Проверяем соединения с базами.
     await redis.redis.ping()
 
+    # Загружаем ключи подписи токенов.
+    key_ring.load()
+
     # Создаем доступы
     await create_permissions()
 
+    # Подписываемся на сброс кэша доступов ролей.
+    permission_cache_listener = asyncio.create_task(permission_cache.listen(redis.redis))
+    # Загружаем фильтр отозванных токенов и следим за новыми отзывами.
+    revocation_listener = asyncio.create_task(revocation_filter.listen(redis.redis))
+    # Пишем в Postgres сессии из журнала. Работает и при выключенном журнале, чтобы дописать остаток.
+    session_journal_writer = asyncio.create_task(session_journal.consume(redis.redis))
+    # Создаем секции сессий вперед, пока сервис работает.
+    partitions_keeper = asyncio.create_task(keep_partitions(
+        project_settings.sessions_partitions_ahead, project_settings.sessions_partitions_interval
+    ))
+
     yield
 
+    permission_cache_listener.cancel()
+    revocation_listener.cancel()
+    session_journal_writer.cancel()
+    partitions_keeper.cancel()
+    shutdown_executor()
+
     # Отключаемся от баз при выключении сервера
     await redis.redis.close()
 
+    # Дописываем очереди логов.
+    stop_logging()
+
 
 @AuthJWT.load_config
 def get_config():
@@ -60,6 +95,19 @@ app.include_router(auth.router, prefix='/api/v1')
 app.include_router(users.router, prefix='/api/v1')
 app.include_router(roles.router, prefix='/api/v1')
 
+# Метрики сервиса в формате Prometheus: время запросов по маршрутам и его разбивка по этапам.
+app.add_middleware(MetricsMiddleware)
+app.mount('/metrics', make_asgi_app(get_registry()))
+
+
+@app.get('/.well-known/jwks.json', include_in_schema=False)
+async def jwks(request: Request) -> Response:
+    # Открытые ключи для проверки токенов другими сервисами. Тело готовится при загрузке ключей.
+    headers = {'Cache-Control': f'public, max-age={project_settings.jwks_max_age}', 'ETag': key_ring.etag}
+    if request.headers.get('if-none-match') == key_ring.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(key_ring.jwks, media_type='application/json', headers=headers)
+
 
 @app.exception_handler(AuthJWTException)
 def authjwt_exception_handler(_: Request, exc: AuthJWTException):
@@ -11,7 +11,7 @@ class Permission(IdMixin, TimestampMixin, Base):
 
     name = Column(String(255), unique=True, nullable=False)
 
-    roles = relationship('RolePermission', back_populates='permission', lazy='selectin')
+    roles = relationship('RolePermission', back_populates='permission', lazy='raise_on_sql')
 
     def __repr__(self) -> str:
         return f'<Permission {self.name}>'
@@ -32,8 +32,8 @@ class RolePermission(IdMixin, TimestampMixin, Base):
                            ForeignKey('permissions.id', ondelete='CASCADE'),
                            nullable=False)
 
-    permission = relationship('Permission', back_populates='roles', lazy='selectin')
-    role = relationship('Role', back_populates='permissions', lazy='selectin')
+    permission = relationship('Permission', back_populates='roles', lazy='raise_on_sql')
+    role = relationship('Role', back_populates='permissions', lazy='raise_on_sql')
 
 
 user_management = Permission(name='USER_MANAGEMENT_PERMISSION')
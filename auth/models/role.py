@@ -11,11 +11,12 @@ class Role(IdMixin, TimestampMixin, Base):
 
     name = Column(String(255), unique=True, nullable=False)
 
-    users = relationship('UserRole', back_populates='role', lazy='selectin')
-    permissions = relationship('RolePermission', back_populates='role', lazy='selectin')
+    # Связи не загружаются неявно: нужные подгружаются в запросе через selectinload/joinedload.
+    users = relationship('UserRole', back_populates='role', lazy='raise_on_sql')
+    permissions = relationship('RolePermission', back_populates='role', lazy='raise_on_sql')
 
     def __repr__(self) -> str:
-        return f'<Role {self.name}, permissions: {self.permissions}>'
+        return f'<Role {self.name}>'
 
 
 class UserRole(IdMixin, TimestampMixin, Base):
@@ -32,5 +33,5 @@ class UserRole(IdMixin, TimestampMixin, Base):
                      ForeignKey('roles.id', ondelete='CASCADE'),
                      nullable=False)
 
-    role = relationship('Role', back_populates='users', lazy='selectin')
-    user = relationship('User', back_populates='roles', lazy='selectin')
+    role = relationship('Role', back_populates='users', lazy='raise_on_sql')
+    user = relationship('User', back_populates='roles', lazy='raise_on_sql')
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Column, String, ForeignKey, UUID, DateTime
+from sqlalchemy import Column, String, ForeignKey, UUID, DateTime, Index, text
 from db.postgres import Base
 from models.mixin import IdMixin, TimestampMixin
 
@@ -8,15 +8,32 @@ from models.mixin import IdMixin, TimestampMixin
 class Session(IdMixin, TimestampMixin, Base):
     __tablename__ = 'sessions'
 
+    __table_args__ = (
+        # Активные сессии пользователя для выхода из всех сессий.
+        Index('ix_sessions_user_id_expire', 'user_id', 'expire', postgresql_where='revoked_at IS NULL'),
+        # История входов пользователя, постранично по курсору (created_at, id).
+        Index(
+            'ix_sessions_user_id_created_at_id', 'user_id', text('created_at DESC'), text('id DESC')
+        ),
+        # Месячные секции по created_at, см. cli/sessions_partitions.py.
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+
+    # Ключ секционирования входит в первичный ключ вместе с id.
+    created_at = Column(DateTime, primary_key=True, default=datetime.utcnow)
+
     user_id = Column(UUID(as_uuid=True), ForeignKey('users.id', ondelete='CASCADE'))
     refresh_token = Column(String, nullable=False)
+    refresh_jti = Column(UUID(as_uuid=True), nullable=True)
     expire = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, nullable=True)
 
     def __init__(
-            self, user_id: str, refresh_token: str, expire: datetime
+            self, user_id: str, refresh_token: str, refresh_jti: str, expire: datetime
     ) -> None:
         self.user_id = user_id
         self.refresh_token = refresh_token
+        self.refresh_jti = refresh_jti
         self.expire = expire
 
     def __repr__(self) -> str:
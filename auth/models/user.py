@@ -1,9 +1,9 @@
 from sqlalchemy import Column, String, Boolean
 from sqlalchemy.orm import relationship
-from werkzeug.security import check_password_hash, generate_password_hash
 
 from db.postgres import Base
 from models.mixin import IdMixin, TimestampMixin
+from utils.hashing import hash_password, verify_password
 
 
 class User(IdMixin, TimestampMixin, Base):
@@ -19,23 +19,24 @@ class User(IdMixin, TimestampMixin, Base):
     def __init__(
             self, login: str, password: str, first_name: str, last_name: str, email: str, superuser: bool = False
     ) -> None:
+        # Пароль передается уже захэшированным, см. utils.hashing.hash_password.
         self.login = login
-        self.password = generate_password_hash(password)
+        self.password = password
         self.first_name = first_name
         self.last_name = last_name
         self.email = email
         self.superuser = superuser or False
 
-    roles = relationship('UserRole', back_populates='user', lazy='selectin')
+    roles = relationship('UserRole', back_populates='user', lazy='raise_on_sql')
 
-    def check_password(self, password: str) -> bool:
-        return check_password_hash(self.password, password)
+    async def check_password(self, password: str) -> bool:
+        return await verify_password(self.password, password)
 
-    def update(self, login: str | None = None, password: str | None = None) -> None:
+    async def update(self, login: str | None = None, password: str | None = None) -> None:
         if login:
             self.login = login
         if password:
-            self.password = generate_password_hash(password)
+            self.password = await hash_password(password)
 
     def __repr__(self) -> str:
         return f'<User {self.login}>'
@@ -9,3 +9,12 @@ class PermissionResponse(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class RolePermissionsSet(BaseModel):
+    permission_ids: list[UUID] = Field(title='Полный набор доступов роли')
+
+
+class RolePermissionsChanged(BaseModel):
+    added: list[UUID] = Field(title='Добавленные доступы')
+    removed: list[UUID] = Field(title='Удаленные доступы')
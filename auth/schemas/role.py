@@ -12,3 +12,22 @@ class RoleResponse(RoleBase):
 
     class Config:
         orm_mode = True
+
+
+class UserRolePair(BaseModel):
+    user_id: UUID = Field(title='Идентификатор пользователя')
+    role_id: UUID = Field(title='Идентификатор роли')
+
+
+class UserRolesAssign(BaseModel):
+    user_roles: list[UserRolePair] = Field(title='Назначаемые роли', min_length=1, max_length=10000)
+
+
+class UserRoleFailed(UserRolePair):
+    detail: str = Field(title='Причина')
+
+
+class UserRolesAssigned(BaseModel):
+    assigned: list[UserRolePair] = Field(title='Назначенные роли')
+    existing: list[UserRolePair] = Field(title='Уже назначенные ранее роли')
+    failed: list[UserRoleFailed] = Field(title='Не назначенные роли')
@@ -92,3 +92,9 @@ class SessionRecord(BaseModel):
     created_at: datetime = Field(description='Время создания сессии', example=datetime.now())
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class SessionHistory(BaseModel):
+    """Страница истории входов"""
+    sessions: list[SessionRecord]
+    next_cursor: Annotated[str | None, Field(description='Курсор следующей страницы')] = None
@@ -1,41 +1,51 @@
 import datetime
-from functools import lru_cache
+import time
 from http import HTTPStatus
-from uuid import UUID
+from uuid import UUID, uuid4
 
 import sqlalchemy.orm.attributes
-from async_fastapi_jwt_auth import AuthJWT
 from fastapi import HTTPException, Depends
 from fastapi.encoders import jsonable_encoder
 from psycopg.errors import UniqueViolation
 from redis.asyncio import Redis
-from sqlalchemy import select
+from sqlalchemy import func, insert, select, tuple_, update
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from core.config import project_settings
+from core.metrics import metered
 from db.postgres import get_session
 from db.redisdb import get_redis
 from models import UserRole
 from models.session import Session
 from models.user import User
 from schemas.error import ErrorConflict
-from schemas.user import JWTAccessToken, UserProfile, RevokedSessions, NewSession, \
-    RevokedTokens, UpdatedProfileFields, UserAttributes, UserCredentials, SessionRecord
+from schemas.user import UserProfile, RevokedSessions, NewSession, \
+    RevokedTokens, UpdatedProfileFields, UserAttributes, UserCredentials, SessionRecord, SessionHistory
+from services.auth_context import AuthContext, get_jwt
+from services.denylist import publish_revocation
+from services.login_throttle import login_throttle
+from services.permission_cache import permission_cache
+from services.refresh_sessions import REUSED, ROTATED, refresh_sessions
+from services.session_journal import session_journal
+from utils.cursor import decode_cursor, encode_cursor
+from utils.hashing import hash_password
 
 
+@metered
 class AuthService:
     pass
     """
     UserService содержит бизнес-логику по работе с пользователями и доступами.
     """
 
-    def __init__(self, db: AsyncSession, jwt: AuthJWT, redis: Redis) -> None:
+    def __init__(self, db: AsyncSession, jwt: AuthContext, redis: Redis) -> None:
         self.db = db
         self.jwt = jwt
         self.redis = redis
 
     async def create_user(self, request: UserProfile) -> User:
-        user = User(**jsonable_encoder(request))
+        user = User(**(jsonable_encoder(request) | {'password': await hash_password(request.password)}))
         self.db.add(user)
         try:
             await self.db.commit()
@@ -47,81 +57,182 @@ class AuthService:
         await self.db.refresh(user)
         return user
 
-    async def authenticate(self, login: str, password: str) -> NewSession:
-        user_found = (await self.db.execute(select(User).where(User.login == login))).scalars().first()
-        if not user_found or not user_found.check_password(password):
+    async def authenticate(self, login: str, password: str, ip: str | None = None) -> NewSession:
+        # Перебор паролей отсекается до запроса в Postgres и хэширования.
+        await login_throttle.hit(self.redis, login, ip)
+        # Пользователь и идентификаторы его ролей одним запросом.
+        user_found, roles_ids = (await self.db.execute(
+            select(User, func.array_remove(func.array_agg(UserRole.role_id), None)).
+            outerjoin(UserRole, UserRole.user_id == User.id).
+            where(User.login == login).
+            group_by(User.id)
+        )).first() or (None, None)
+        if not user_found or not await user_found.check_password(password):
             raise HTTPException(status_code=HTTPStatus.FORBIDDEN)
-        roles_ids = [str(uuid) for uuid in (await self.db.execute(select(UserRole.role_id).
-                                                                  join(User).
-                                                                  where(User.login == login))
-                                            ).scalars().all()]
-        access_token = await self.jwt.create_access_token(subject=str(user_found.id),
-                                                          user_claims={'roles': roles_ids,
-                                                                       'superuser': user_found.superuser})
-        refresh_token = await self.jwt.create_refresh_token(subject=str(user_found.id))
-
-        session = Session(
-            user_id=user_found.id,
-            refresh_token=refresh_token,
-            expire=datetime.datetime.utcfromtimestamp((await self.jwt.get_raw_jwt(refresh_token))["exp"])
+        session_id = uuid4()
+        access_token, refresh_token, access_jwt, refresh_jwt = await self._issue_tokens(
+            str(user_found.id), str(session_id), [str(uuid) for uuid in roles_ids], user_found.superuser
         )
-        self.db.add(session)
 
-        try:
-            await self.db.commit()
-            await self.db.refresh(session)
-        except IntegrityError as e:
-            await self.db.rollback()
-            if isinstance(e.orig, UniqueViolation):
-                raise HTTPException(status_code=HTTPStatus.CONFLICT, **ErrorConflict(e.orig).model_dump())
-            raise e
+        session = {
+            'id': session_id,
+            'user_id': user_found.id,
+            'refresh_token': refresh_token,
+            'refresh_jti': refresh_jwt['jti'],
+            'expire': datetime.datetime.utcfromtimestamp(refresh_jwt['exp']),
+        }
+        journaled = session_journal.accepting()
+        if not journaled:
+            try:
+                await self.db.execute(insert(Session).values(session))
+                await self.db.commit()
+            except IntegrityError as e:
+                await self.db.rollback()
+                if isinstance(e.orig, UniqueViolation):
+                    raise HTTPException(status_code=HTTPStatus.CONFLICT, **ErrorConflict(e.orig).model_dump())
+                raise e
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            refresh_sessions.start(pipe, str(session_id), str(user_found.id), refresh_jwt, access_jwt)
+            if journaled:
+                # Сессия попадет в Postgres из журнала, см. services/session_journal.py.
+                session_journal.append(pipe, **session, created_at=datetime.datetime.utcnow())
+            await pipe.execute()
 
         return NewSession(
-            session_id=session.id,
+            session_id=session_id,
             access_token=access_token,
             refresh_token=refresh_token
         )
 
+    async def _issue_tokens(
+            self, user_id: str, session_id: str, roles: list[str], superuser: bool, refresh_expires: int | None = None
+    ) -> tuple[str, str, dict, dict]:
+        user_claims = {'roles': roles, 'superuser': superuser}
+        if project_settings.permissions_in_token:
+            # Маска помечается версией, при которой загружены доступы. После любого изменения доступов
+            # версия в Redis растет, и check_access проверяет доступы такого токена по ролям.
+            version, mask = await permission_cache.get_permissions_mask(self.db, self.redis, roles)
+            if version is not None:
+                user_claims['permissions_version'] = version
+                user_claims['permissions'] = mask
+        access_token = await self.jwt.create_access_token(subject=user_id, user_claims=user_claims)
+        # Токен обновления несет сессию и роли, чтобы обновление не ходило в Postgres.
+        refresh_token = await self.jwt.create_refresh_token(
+            subject=user_id, expires_time=refresh_expires,
+            user_claims={'sid': session_id, 'roles': roles, 'superuser': superuser}
+        )
+        return (access_token, refresh_token,
+                await self.jwt.get_raw_jwt(access_token), await self.jwt.get_raw_jwt(refresh_token))
+
     async def logout(self, user_id: UUID | None = None) -> RevokedSessions:
-        await self.jwt.jwt_required()
+        access_jwt = await self.jwt.get_access_claims()
         if user_id is None:
-            user_id = (await self.jwt.get_raw_jwt())['sub']
+            user_id = access_jwt['sub']
+        tokens = await self.end_sessions([user_id])
+        # Вместе с токенами обновления отзываем текущий access токен.
+        tokens.append((access_jwt['jti'], datetime.datetime.utcfromtimestamp(access_jwt['exp'])))
+
+        return RevokedSessions(sessions=await self.revoke_tokens(list(dict(tokens).items())))
+
+    async def end_sessions(self, user_ids: list[UUID | str]) -> list[tuple[str, datetime.datetime]]:
+        """Завершает активные сессии пользователей и возвращает (jti, exp) их токенов для revoke_tokens."""
+        if not user_ids:
+            return []
+        # Текущие токены сессий после ротации и еще не записанные из журнала сессии знает только Redis.
+        # Redis отзываем раньше Postgres: журнал переносит отзыв в строки, которые вставит позже.
+        tokens = await refresh_sessions.revoke_users(self.redis, [str(user_id) for user_id in user_ids])
+        now = datetime.datetime.utcnow()
+        # Одним запросом помечаем активные сессии отозванными и получаем jti их токенов обновления.
         sessions = (
             await self.db.execute(
-                select(Session).
-                where(Session.user_id == user_id).
-                where(Session.expire >= datetime.datetime.utcnow())
+                update(Session).
+                where(Session.user_id.in_(user_ids)).
+                where(Session.expire >= now).
+                # Неистекшие сессии созданы не раньше времени жизни токена обновления: лишние секции отсекаются.
+                where(Session.created_at >= now - datetime.timedelta(
+                    seconds=project_settings.authjwt_refresh_token_expires)).
+                where(Session.revoked_at.is_(None)).
+                values(revoked_at=now).
+                returning(Session.refresh_jti, Session.expire).
+                execution_options(synchronize_session=False)
             )
-        ).scalars().all()
-        revoked_sessions = []
-        for session in sessions:
-            token = await self.revoke_token(session.refresh_token, False)
-            if token:
-                # Отзыв соответствующего токена обновления.
-                revoked_sessions.append(token)
-
-        # Отзыв текущего access токена.
-        revoked_sessions.append(await self.revoke_token())
+        ).all()
+        await self.db.commit()
 
-        return RevokedSessions(sessions=revoked_sessions)
+        # У сессий, созданных до появления refresh_jti, jti токена обновления неизвестен.
+        tokens += [(str(refresh_jti), expire) for refresh_jti, expire in sessions if refresh_jti is not None]
+        return tokens
 
-    async def refresh_token(self) -> JWTAccessToken:
+    async def refresh_token(self) -> NewSession:
         await self.jwt.jwt_refresh_token_required()
-        return JWTAccessToken(access_token=await self.jwt.create_access_token(subject=await self.jwt.get_jwt_subject()))
+        refresh_jwt = await self.jwt.get_raw_jwt()
+        if 'sid' not in refresh_jwt:
+            # Токен выдан до ротации токенов обновления.
+            raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail='Session expired')
 
-    async def revoke_token(self, token: str = None, force: bool = True) -> str:
+        # Новый токен обновления истекает вместе с сессией.
+        access_token, refresh_token, access_jwt, new_refresh_jwt = await self._issue_tokens(
+            refresh_jwt['sub'], refresh_jwt['sid'], refresh_jwt['roles'], refresh_jwt['superuser'],
+            refresh_expires=max(refresh_jwt['exp'] - int(time.time()), 1)
+        )
+        status, tokens = await refresh_sessions.rotate(
+            self.redis, refresh_jwt['sid'], refresh_jwt['jti'], new_refresh_jwt, access_jwt
+        )
+        if status == REUSED:
+            # Повторно предъявлен прежний токен обновления: отзываем выданные сессии токены.
+            await self.revoke_tokens(tokens)
+            refresh_sessions.update_later(refresh_jwt['sid'], revoked_at=datetime.datetime.utcnow())
+        if status != ROTATED:
+            raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail='Session revoked')
+
+        refresh_sessions.update_later(
+            refresh_jwt['sid'], refresh_jti=new_refresh_jwt['jti'], modified_at=datetime.datetime.utcnow()
+        )
+        return NewSession(session_id=refresh_jwt['sid'], access_token=access_token, refresh_token=refresh_token)
+
+    async def revoke_token(self, token: str = None) -> str:
         # По умолчанию отзываем текущий токен доступа.
         jti = (await self.jwt.get_raw_jwt(token))
-        revoked = force or (not await self.redis.get(jti["jti"]))
+        await self.revoke_tokens([(jti["jti"], datetime.datetime.utcfromtimestamp(jti["exp"]))])
+        return jti["jti"]
+
+    async def revoke_tokens(self, tokens: list[tuple[str, datetime.datetime]]) -> list[str]:
+        """Отзывает пачку токенов по (jti, exp) одним пайплайном, возвращает ранее не отозванные jti."""
+        if not tokens:
+            return []
         # В редис кладется jti токена для инвалидации.
-        await self.redis.setex(
-            jti["jti"], datetime.datetime.utcfromtimestamp(jti["exp"]) - datetime.datetime.utcnow(), 'revoked'
-        )
-        return jti["jti"] if revoked else None
+        now = datetime.datetime.utcnow()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for jti, expire in tokens:
+                pipe.set(jti, 'revoked', ex=max(int((expire - now).total_seconds()), 1), get=True)
+            for jti, expire in tokens:
+                publish_revocation(pipe, jti, int(expire.replace(tzinfo=datetime.timezone.utc).timestamp()))
+            previous = await pipe.execute()
+        return [jti for (jti, _), value in zip(tokens, previous) if value != b'revoked']
 
     async def revoke_refresh_token(self) -> RevokedTokens:
         await self.jwt.jwt_refresh_token_required()
-        return RevokedTokens(tokens=[await self.revoke_token()])
+        refresh_jwt = await self.jwt.get_raw_jwt()
+        tokens = [(refresh_jwt['jti'], datetime.datetime.utcfromtimestamp(refresh_jwt['exp']))]
+        if 'sid' in refresh_jwt:
+            # Отзываем сессию целиком, вместе с выданными после ротации токенами.
+            tokens += await refresh_sessions.revoke(self.redis, [refresh_jwt['sid']])
+            session_filter = Session.id == refresh_jwt['sid']
+        else:
+            session_filter = Session.refresh_jti == refresh_jwt['jti']
+        await self.revoke_tokens(list(dict(tokens).items()))
+        await self.db.execute(
+            update(Session).
+            where(session_filter).
+            where(Session.created_at >= datetime.datetime.utcnow() - datetime.timedelta(
+                seconds=project_settings.authjwt_refresh_token_expires)).
+            where(Session.revoked_at.is_(None)).
+            values(revoked_at=datetime.datetime.utcnow()).
+            execution_options(synchronize_session=False)
+        )
+        await self.db.commit()
+        return RevokedTokens(tokens=[refresh_jwt['jti']])
 
     async def revoke_access_token(self) -> RevokedTokens:
         await self.jwt.jwt_required()
@@ -132,7 +243,7 @@ class AuthService:
         user = await self.db.get(User, await self.jwt.get_jwt_subject())
         if not user:
             raise HTTPException(status_code=HTTPStatus.NOT_FOUND)
-        user.update(**request.model_dump())
+        await user.update(**request.model_dump())
         updated_fields = []
         for field in UserCredentials.model_fields.keys():
             if sqlalchemy.orm.attributes.get_history(user, field).has_changes():
@@ -155,7 +266,7 @@ class AuthService:
             raise HTTPException(status_code=HTTPStatus.NOT_FOUND)
         return UserAttributes.model_validate(user)
 
-    async def get_history(self, pagesize: int, page: int) -> list[SessionRecord]:
+    async def get_history(self, pagesize: int, page: int, cursor: str | None = None) -> SessionHistory:
         await self.jwt.jwt_required()
 
         if pagesize < 0:
@@ -165,19 +276,35 @@ class AuthService:
         if page < 1:
             page = 1
 
-        return [
-            SessionRecord.model_validate(session) for session in
-            (await self.db.scalars(
-                select(Session).
-                where(Session.user_id == await self.jwt.get_jwt_subject()).
-                limit(pagesize).
-                offset((page-1)*pagesize)
-            )).all()
-        ]
+        query = (
+            select(Session).
+            where(Session.user_id == await self.jwt.get_jwt_subject()).
+            order_by(Session.created_at.desc(), Session.id.desc()).
+            limit(pagesize + 1)
+        )
+        if cursor:
+            # Постраничный вывод по курсору не зависит от глубины страницы.
+            try:
+                created_at, session_id = decode_cursor(cursor)
+            except ValueError:
+                raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail='Invalid cursor')
+            query = query.where(tuple_(Session.created_at, Session.id) < (created_at, session_id))
+        else:
+            query = query.offset((page-1)*pagesize)
+
+        sessions = (await self.db.scalars(query)).all()
+        next_cursor = None
+        if len(sessions) > pagesize:
+            sessions = sessions[:pagesize]
+            next_cursor = encode_cursor(sessions[-1].created_at, sessions[-1].id)
+
+        return SessionHistory(
+            sessions=[SessionRecord.model_validate(session) for session in sessions],
+            next_cursor=next_cursor
+        )
 
 
-@lru_cache()
-def get_auth_service(
-        db: AsyncSession = Depends(get_session), jwt: AuthJWT = Depends(), redis: Redis = Depends(get_redis)
+async def get_auth_service(
+        db: AsyncSession = Depends(get_session), jwt: AuthContext = Depends(get_jwt), redis: Redis = Depends(get_redis)
 ) -> AuthService:
     return AuthService(db, jwt, redis)
@@ -0,0 +1,86 @@
+from typing import Optional
+
+import jwt
+from async_fastapi_jwt_auth import AuthJWT
+from async_fastapi_jwt_auth.exceptions import InvalidHeaderError, JWTDecodeError
+from fastapi import Request, Response
+
+from core.metrics import JWT_DURATION, measure
+from services.jwt_keys import key_ring
+
+
+class AuthContext(AuthJWT):
+    """
+    AuthJWT одного запроса.
+
+    Проверенные утверждения токена и результат сверки со списком отозванных токенов
+    запоминаются, поэтому повторные jwt_required() и get_raw_jwt() из декоратора
+    check_access и методов сервисов не проверяют подпись и не ходят в Redis снова.
+
+    При асимметричном алгоритме токены подписываются текущим ключом из key_ring с его kid
+    в заголовке и проверяются открытым ключом по kid.
+    """
+
+    def __init__(self, req: Request = None, res: Response = None) -> None:
+        super().__init__(req=req, res=res)
+        self._verified: dict[tuple[str, Optional[str]], dict] = {}
+        self._not_revoked: set[tuple[str, Optional[str]]] = set()
+
+    async def _create_token(self, *args, headers: Optional[dict] = None, **kwargs) -> str:
+        if key_ring.enabled:
+            headers = {'kid': key_ring.signing_kid} | (headers or {})
+        with measure(JWT_DURATION.labels('encode'), 'jwt'):
+            return await super()._create_token(*args, headers=headers, **kwargs)
+
+    async def _get_secret_key(self, algorithm: str, process: str):
+        if key_ring.enabled and process == 'encode':
+            # Уже разобранный ключ: PyJWT не разбирает PEM при каждой подписи.
+            return key_ring.signing_key
+        return await super()._get_secret_key(algorithm, process)
+
+    async def _verified_token(self, encoded_token: str, issuer: Optional[str] = None) -> dict:
+        key = (encoded_token, issuer)
+        if key not in self._verified:
+            with measure(JWT_DURATION.labels('decode'), 'jwt'):
+                if key_ring.enabled:
+                    self._verified[key] = await self._verified_by_key_ring(encoded_token, issuer)
+                else:
+                    self._verified[key] = await super()._verified_token(encoded_token, issuer)
+        return self._verified[key]
+
+    async def _verified_by_key_ring(self, encoded_token: str, issuer: Optional[str] = None) -> dict:
+        try:
+            headers = await self.get_unverified_jwt_headers(encoded_token)
+        except Exception as err:
+            raise InvalidHeaderError(status_code=422, message=str(err))
+        public_key = key_ring.public_keys.get(headers.get('kid'))
+        if public_key is None:
+            raise InvalidHeaderError(status_code=422, message='Unknown key id')
+        try:
+            return jwt.decode(
+                encoded_token,
+                public_key,
+                issuer=issuer,
+                audience=self._decode_audience,
+                leeway=self._decode_leeway,
+                algorithms=[key_ring.algorithm],
+            )
+        except Exception as err:
+            raise JWTDecodeError(status_code=422, message=str(err))
+
+    async def _verifying_token(self, encoded_token: str, issuer: Optional[str] = None) -> None:
+        key = (encoded_token, issuer)
+        if key not in self._not_revoked:
+            await super()._verifying_token(encoded_token, issuer)
+            self._not_revoked.add(key)
+
+    async def get_access_claims(self) -> dict:
+        """Утверждения текущего токена доступа, проверенного один раз за запрос."""
+        await self.jwt_required()
+        return await self.get_raw_jwt()
+
+
+# Фабрики зависимостей асинхронные: синхронные FastAPI вызывает в пуле потоков на каждый запрос.
+# Внутри запроса каждая зависимость создается один раз и переиспользуется всеми, кто от нее зависит.
+async def get_jwt(req: Request, res: Response) -> AuthContext:
+    return AuthContext(req=req, res=res)
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import math
+import time
+from hashlib import blake2b
+
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+from core.config import project_settings
+from core.metrics import (
+    DENYLIST_FILTER_ENTRIES, DENYLIST_FILTER_FALSE_POSITIVE_RATE, DENYLIST_FILTER_FALSE_POSITIVES,
+    DENYLIST_FILTER_HITS, DENYLIST_FILTER_LOAD_DURATION, DENYLIST_FILTER_LOOKUPS, DENYLIST_FILTER_MEMORY,
+)
+
+logger = logging.getLogger(__name__)
+
+# Поток Redis, в который пишутся все отзывы токенов.
+REVOCATION_STREAM = 'denylist:revoked'
+# Запас на расхождение часов сервиса и Redis, сек.
+CLOCK_SKEW = 60
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, key: str) -> list[int]:
+        digest = blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str) -> None:
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+    def false_positive_rate(self) -> float:
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+class RevocationFilter:
+    """
+    Локальный фильтр Блума отозванных jti перед запросом в Redis.
+
+    Отзывы пишутся в поток Redis, каждый воркер вычитывает его и добавляет jti в фильтр
+    корзины по времени истечения токена. Истекшие корзины удаляются целиком.
+    Ответ "нет" окончательный, ответ "возможно" проверяется в Redis. Пока фильтр не
+    загружен, а также для токенов, выписанных раньше начала потока, всегда идем в Redis.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, bucket: int) -> None:
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bucket = bucket
+        self.ready = False
+        # Время (сек.), начиная с которого поток содержит все отзывы.
+        self.horizon = math.inf
+        self._buckets: dict[int, BloomFilter] = {}
+
+    def add(self, jti: str, exp: int) -> None:
+        index = exp // self.bucket
+        if (index + 1) * self.bucket < time.time():
+            return
+        if index not in self._buckets:
+            self._buckets[index] = BloomFilter(self.capacity, self.error_rate)
+        self._buckets[index].add(jti)
+
+    def covers(self, token: dict) -> bool:
+        """Ответ фильтра для токена достоверен: фильтр загружен и токен выписан после начала потока."""
+        return self.ready and token.get('iat', 0) >= self.horizon
+
+    def might_contain(self, token: dict) -> bool:
+        DENYLIST_FILTER_LOOKUPS.inc()
+        if not self.covers(token):
+            hit = True
+        else:
+            index = token['exp'] // self.bucket
+            hit = index in self._buckets and token['jti'] in self._buckets[index]
+        if hit:
+            DENYLIST_FILTER_HITS.inc()
+        return hit
+
+    def false_positive(self) -> None:
+        DENYLIST_FILTER_FALSE_POSITIVES.inc()
+
+    def expire(self) -> None:
+        now = time.time()
+        for index in [index for index in self._buckets if (index + 1) * self.bucket < now]:
+            del self._buckets[index]
+        DENYLIST_FILTER_MEMORY.set(sum(len(bloom.bits) for bloom in self._buckets.values()))
+        DENYLIST_FILTER_ENTRIES.set(sum(bloom.count for bloom in self._buckets.values()))
+        DENYLIST_FILTER_FALSE_POSITIVE_RATE.set(
+            max((bloom.false_positive_rate() for bloom in self._buckets.values()), default=0)
+        )
+
+    def reset(self) -> None:
+        self.ready = False
+        self.horizon = math.inf
+        self._buckets.clear()
+
+    def _apply(self, entries: list) -> str | None:
+        last_id = None
+        for entry_id, fields in entries:
+            last_id = entry_id
+            if b'jti' in fields:
+                self.add(fields[b'jti'].decode(), int(fields[b'exp']))
+        return last_id
+
+    async def _bootstrap(self, redis: Redis) -> str:
+        if not await redis.exists(REVOCATION_STREAM):
+            # Отметка начала потока: более ранние отзывы в нем отсутствуют.
+            await redis.xadd(REVOCATION_STREAM, {'init': 1})
+        last_id = '-'
+        first_id = None
+        while True:
+            entries = await redis.xrange(REVOCATION_STREAM, min=last_id, count=10000)
+            if last_id != '-':
+                entries = entries[1:]
+            if not entries:
+                break
+            first_id = first_id or entries[0][0]
+            last_id = self._apply(entries)
+        if first_id is None:
+            # Поток пуст, о прошлых отзывах ничего не известно.
+            self.horizon = time.time() + CLOCK_SKEW
+            last_id = '0-0'
+        else:
+            self.horizon = int(first_id.split(b'-')[0]) / 1000 + CLOCK_SKEW
+        self.ready = True
+        self.expire()
+        return last_id
+
+    async def listen(self, redis: Redis) -> None:
+        while True:
+            try:
+                started = time.perf_counter()
+                last_id = await self._bootstrap(redis)
+                DENYLIST_FILTER_LOAD_DURATION.set(time.perf_counter() - started)
+                while True:
+                    for _, entries in await redis.xread({REVOCATION_STREAM: last_id}, block=5000, count=10000):
+                        last_id = self._apply(entries) or last_id
+                    self.expire()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Revocation stream listener failed, rebuilding denylist filter')
+                self.reset()
+                await asyncio.sleep(1)
+
+
+def publish_revocation(pipe: Pipeline, jti: str, exp: int) -> None:
+    # Хвост потока старше времени жизни токена обновления больше не нужен.
+    min_id = int((time.time() - project_settings.authjwt_refresh_token_expires) * 1000)
+    pipe.xadd(REVOCATION_STREAM, {'jti': jti, 'exp': exp}, minid=min_id, approximate=True)
+    revocation_filter.add(jti, exp)
+
+
+revocation_filter = RevocationFilter(
+    project_settings.denylist_filter_capacity,
+    project_settings.denylist_filter_error_rate,
+    project_settings.denylist_filter_bucket,
+)
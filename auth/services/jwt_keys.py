@@ -0,0 +1,84 @@
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey, RSAPublicKey
+from cryptography.hazmat.primitives.serialization import load_pem_private_key, load_pem_public_key
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+
+from core.config import project_settings
+
+logger = logging.getLogger(__name__)
+
+# Асимметричные алгоритмы подписи и типы ключей, которые им подходят.
+KEY_TYPES = {
+    'RS256': (RSAPrivateKey, RSAPublicKey, RSAAlgorithm),
+    'RS384': (RSAPrivateKey, RSAPublicKey, RSAAlgorithm),
+    'RS512': (RSAPrivateKey, RSAPublicKey, RSAAlgorithm),
+    'EdDSA': (Ed25519PrivateKey, Ed25519PublicKey, OKPAlgorithm),
+}
+
+
+class KeyRing:
+    """
+    Ключи подписи токенов.
+
+    Ключи лежат в каталоге PEM-файлами, имя файла без расширения - идентификатор ключа (kid).
+    Токены подписываются закрытым ключом signing_kid (по умолчанию последним по имени файла),
+    а проверяются открытым ключом из заголовка kid, так что при ротации токены, подписанные
+    прежним ключом, действуют, пока его файл лежит в каталоге. Открытые ключи публикуются
+    в JWKS, чтобы другие сервисы проверяли токены сами.
+
+    Ключи загружаются один раз при старте воркера. Порядок ротации: положить новый ключ,
+    перезапустить воркеры, дождаться, пока потребители обновят JWKS, назначить его signing_kid.
+    """
+
+    def __init__(self, algorithm: str, keys_dir: str | None, signing_kid: str | None) -> None:
+        self.algorithm = algorithm
+        self.keys_dir = keys_dir
+        self.signing_kid = signing_kid
+        self.signing_key = None
+        self.public_keys: dict = {}
+        self.jwks = b'{"keys":[]}'
+        self.etag = '"' + hashlib.sha256(self.jwks).hexdigest()[:32] + '"'
+
+    @property
+    def enabled(self) -> bool:
+        return self.algorithm in KEY_TYPES
+
+    def load(self) -> None:
+        if not self.enabled:
+            return
+        if not self.keys_dir:
+            raise RuntimeError(f'project_jwt_keys_dir must be set when using algorithm {self.algorithm}')
+        private_type, public_type, algorithm = KEY_TYPES[self.algorithm]
+
+        private_keys, public_keys = {}, {}
+        for path in sorted(Path(self.keys_dir).glob('*.pem')):
+            data = path.read_bytes()
+            if b'PRIVATE KEY' in data:
+                private_keys[path.stem] = load_pem_private_key(data, password=None)
+                public_keys[path.stem] = private_keys[path.stem].public_key()
+            else:
+                public_keys[path.stem] = load_pem_public_key(data)
+            if not isinstance(public_keys[path.stem], public_type):
+                raise RuntimeError(f'Key {path} does not match algorithm {self.algorithm}')
+
+        signing_kid = self.signing_kid or max(private_keys, default=None)
+        if signing_kid not in private_keys or not isinstance(private_keys[signing_kid], private_type):
+            raise RuntimeError(f'Private key {signing_kid} for signing tokens not found in {self.keys_dir}')
+
+        self.signing_kid = signing_kid
+        self.signing_key = private_keys[signing_kid]
+        self.public_keys = public_keys
+        self.jwks = json.dumps({'keys': [
+            algorithm.to_jwk(key, as_dict=True) | {'kid': kid, 'alg': self.algorithm, 'use': 'sig'}
+            for kid, key in public_keys.items()
+        ]}, separators=(',', ':')).encode()
+        self.etag = '"' + hashlib.sha256(self.jwks).hexdigest()[:32] + '"'
+        logger.info('Loaded JWT keys %s, signing with %s', ', '.join(public_keys), signing_kid)
+
+
+key_ring = KeyRing(project_settings.authjwt_algorithm, project_settings.jwt_keys_dir, project_settings.jwt_signing_kid)
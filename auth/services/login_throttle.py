@@ -0,0 +1,81 @@
+import time
+from http import HTTPStatus
+from uuid import uuid4
+
+from fastapi import HTTPException
+from redis.asyncio import Redis
+
+from core.config import project_settings
+from core.metrics import LOGIN_THROTTLE_REJECTIONS
+
+LOGIN_KEY = 'login_throttle:login:{}'
+IP_KEY = 'login_throttle:ip:{}'
+
+# KEYS - попытки за окно по логину и по адресу (sorted set, оценка - время попытки, мс).
+# ARGV: текущее время, мс; окно, мс; метка попытки; лимиты KEYS по порядку.
+# Возвращает {0, 0}, если попытка разрешена и учтена, иначе {номер исчерпанного ключа, через сколько мс повторить}.
+# Отклоненные попытки не учитываются, поэтому поток отказов не продлевает блокировку.
+THROTTLE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+for i, key in ipairs(KEYS) do
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+    if redis.call('ZCARD', key) >= tonumber(ARGV[3 + i]) then
+        local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+        if not oldest[2] then
+            return {i, window}
+        end
+        return {i, tonumber(oldest[2]) + window - now}
+    end
+end
+for _, key in ipairs(KEYS) do
+    redis.call('ZADD', key, now, ARGV[3])
+    redis.call('PEXPIRE', key, window)
+end
+return {0, 0}
+"""
+
+
+class LoginThrottle:
+    """
+    Ограничение частоты входов по логину и по адресу клиента.
+
+    Скользящее окно в Redis проверяется и пополняется одним скриптом до запроса в Postgres
+    и проверки пароля, поэтому перебор паролей не нагружает процессор воркера хэшированием.
+    """
+
+    def __init__(self, enabled: bool, window: int, login_limit: int, ip_limit: int) -> None:
+        self.enabled = enabled
+        self.window = window
+        self.login_limit = login_limit
+        self.ip_limit = ip_limit
+        self._throttle = None
+
+    async def hit(self, redis: Redis, login: str, ip: str | None) -> None:
+        """Учитывает попытку входа или отклоняет ее с 429 и Retry-After."""
+        if not self.enabled:
+            return
+        if self._throttle is None:
+            self._throttle = redis.register_script(THROTTLE_SCRIPT)
+        keys, limits = [LOGIN_KEY.format(login)], [self.login_limit]
+        if ip:
+            keys.append(IP_KEY.format(ip))
+            limits.append(self.ip_limit)
+        key, retry_after = await self._throttle(
+            keys=keys, args=[int(time.time() * 1000), self.window * 1000, uuid4().hex, *limits], client=redis
+        )
+        if key:
+            LOGIN_THROTTLE_REJECTIONS.labels('login' if key == 1 else 'ip').inc()
+            raise HTTPException(
+                status_code=HTTPStatus.TOO_MANY_REQUESTS,
+                detail='Too many login attempts',
+                headers={'Retry-After': str(max(-(-int(retry_after) // 1000), 1))},
+            )
+
+
+login_throttle = LoginThrottle(
+    project_settings.login_throttle,
+    project_settings.login_throttle_window,
+    project_settings.login_throttle_login_limit,
+    project_settings.login_throttle_ip_limit,
+)
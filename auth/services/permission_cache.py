@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import time
+from uuid import UUID
+
+from redis.asyncio import Redis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import project_settings
+from models.permission import Permission, RolePermission, permissions
+
+logger = logging.getLogger(__name__)
+
+# Канал Redis, через который воркеры оповещают друг друга об изменении доступов ролей.
+INVALIDATE_CHANNEL = 'permission_cache:invalidate'
+# Сообщение о сбросе всего кэша.
+INVALIDATE_ALL = '*'
+# Счетчик версий доступов ролей. Токен с доступами, выданный при другой версии, считается устаревшим.
+PERMISSIONS_VERSION_KEY = 'permission_cache:version'
+# Бит доступа в маске определяется его именем, а не порядком в списке permissions: порядок
+# может отличаться у разных версий сервиса, а маска в токене должна читаться одинаково.
+PERMISSION_BITS = {name: bit for bit, name in enumerate(sorted(permission.name for permission in permissions))}
+
+
+class PermissionCache:
+    """
+    Кэш соответствия роль -> доступы в памяти воркера.
+
+    Записи загружаются лениво одним запросом на все недостающие роли и живут ttl секунд.
+    Изменения доступов ролей рассылаются всем воркерам через Redis pub/sub и увеличивают
+    версию доступов в Redis. Запись помнит версию, прочитанную до ее загрузки: все изменения
+    после загрузки увеличивают версию дальше, поэтому маска из записей актуальна, пока версия
+    в Redis равна самой ранней версии использованных записей.
+    """
+
+    def __init__(self, ttl: int) -> None:
+        self.ttl = ttl
+        # Роль -> (срок жизни, версия доступов до загрузки, доступы).
+        self._entries: dict[str, tuple[float, int, frozenset[UUID]]] = {}
+        # Растет при каждом сбросе: загрузка, начатая до сброса, не сохраняет устаревший результат.
+        self._generation = 0
+
+    async def get_permissions(self, db: AsyncSession, redis: Redis, role_ids: list[str]) -> set[UUID]:
+        return (await self._lookup(db, redis, role_ids))[1]
+
+    async def get_permissions_mask(
+            self, db: AsyncSession, redis: Redis, role_ids: list[str]
+    ) -> tuple[int | None, int]:
+        """Версия, при которой актуальна маска доступов ролей (None без ролей), и сама маска."""
+        version, role_permissions = await self._lookup(db, redis, role_ids)
+        return version, sum(
+            1 << PERMISSION_BITS[permission.name] for permission in permissions if permission.id in role_permissions
+        )
+
+    @staticmethod
+    def mask_allows(mask: int, permission: Permission) -> bool:
+        return bool(mask >> PERMISSION_BITS[permission.name] & 1)
+
+    @staticmethod
+    async def get_version(redis: Redis) -> int:
+        return int(await redis.get(PERMISSIONS_VERSION_KEY) or 0)
+
+    async def _lookup(self, db: AsyncSession, redis: Redis, role_ids: list[str]) -> tuple[int | None, set[UUID]]:
+        now = time.monotonic()
+        permissions = set()
+        versions = []
+        missing = []
+        for role_id in map(str, role_ids):
+            entry = self._entries.get(role_id)
+            if entry and entry[0] > now:
+                versions.append(entry[1])
+                permissions.update(entry[2])
+            else:
+                missing.append(role_id)
+
+        if missing:
+            generation = self._generation
+            # Версию читаем до загрузки: изменение, которого загрузка не увидела, увеличит ее позже.
+            version = await self.get_version(redis)
+            versions.append(version)
+            loaded = {role_id: set() for role_id in missing}
+            for role_id, permission_id in (await db.execute(
+                    select(RolePermission.role_id, RolePermission.permission_id).
+                    where(RolePermission.role_id.in_(missing))
+            )).all():
+                loaded[str(role_id)].add(permission_id)
+            expire = now + self.ttl
+            for role_id, role_permissions in loaded.items():
+                if generation == self._generation:
+                    self._entries[role_id] = (expire, version, frozenset(role_permissions))
+                permissions.update(role_permissions)
+
+        return min(versions, default=None), permissions
+
+    def drop(self, role_ids: list[str] | None = None) -> None:
+        self._generation += 1
+        if role_ids is None:
+            self._entries.clear()
+            return
+        for role_id in map(str, role_ids):
+            self._entries.pop(role_id, None)
+
+    async def invalidate(self, redis: Redis, role_ids: list[str] | None = None) -> None:
+        # Сбрасываем локальные записи сразу, остальные воркеры получат сообщение из канала.
+        self.drop(role_ids)
+        await redis.incr(PERMISSIONS_VERSION_KEY)
+        await redis.publish(
+            INVALIDATE_CHANNEL, INVALIDATE_ALL if role_ids is None else ','.join(map(str, role_ids))
+        )
+
+    async def listen(self, redis: Redis) -> None:
+        while True:
+            try:
+                async with redis.pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATE_CHANNEL)
+                    # Пока не были подписаны, могли пропустить сообщения.
+                    self.drop()
+                    async for message in pubsub.listen():
+                        if message['type'] != 'message':
+                            continue
+                        data = message['data'].decode()
+                        self.drop(None if data == INVALIDATE_ALL else data.split(','))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Permission cache invalidation listener failed, resubscribing')
+                self.drop()
+                await asyncio.sleep(1)
+
+
+permission_cache = PermissionCache(project_settings.permission_cache_ttl)
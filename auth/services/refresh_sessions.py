@@ -0,0 +1,159 @@
+import asyncio
+import datetime
+import logging
+
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from sqlalchemy import update
+
+from core.config import project_settings
+from db.postgres import async_session
+from models.session import Session
+
+logger = logging.getLogger(__name__)
+
+SESSION_KEY = 'session:{}'
+# Сессии пользователя, чтобы выйти из всех сессий без Postgres.
+USER_SESSIONS_KEY = 'user_sessions:{}'
+
+# Результаты ротации. Сессия, уже отозванная или неизвестная, возвращает b'revoked'.
+ROTATED = b'rotated'
+REUSED = b'reused'
+
+# KEYS[1] - сессия. ARGV: jti предъявленного токена обновления, jti и exp новых токенов обновления и доступа.
+# Предъявлен не текущий токен обновления - его украли или повторили: отзываем сессию целиком.
+ROTATE_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'jti', 'revoked')
+if not state[1] or state[2] then
+    return {'revoked'}
+end
+if state[1] ~= ARGV[1] then
+    redis.call('HSET', KEYS[1], 'revoked', '1')
+    local tokens = redis.call('HMGET', KEYS[1], 'jti', 'exp', 'access_jti', 'access_exp')
+    table.insert(tokens, 1, 'reused')
+    return tokens
+end
+redis.call('HSET', KEYS[1], 'jti', ARGV[2], 'exp', ARGV[3], 'access_jti', ARGV[4], 'access_exp', ARGV[5])
+return {'rotated'}
+"""
+
+# KEYS[1] - сессия. Помечает сессию отозванной и возвращает ее последние токены.
+REVOKE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return {}
+end
+redis.call('HSET', KEYS[1], 'revoked', '1')
+return redis.call('HMGET', KEYS[1], 'jti', 'exp', 'access_jti', 'access_exp')
+"""
+
+
+def _tokens(values: list) -> list[tuple[str, datetime.datetime]]:
+    # [jti, exp, access_jti, access_exp] -> [(jti, exp), ...] для AuthService.revoke_tokens.
+    return [
+        (jti.decode(), datetime.datetime.utcfromtimestamp(int(exp)))
+        for jti, exp in zip(values[::2], values[1::2]) if jti and exp
+    ]
+
+
+class RefreshSessions:
+    """
+    Ротация токенов обновления в Redis.
+
+    Сессия - семейство токенов обновления одного входа - хранится в хэше session:<id>
+    с jti текущего токена обновления и последнего выданного по нему токена доступа.
+    Хэш живет до истечения сессии, идентификаторы сессий пользователя собраны в множество.
+    Обновление атомарно заменяет текущий jti одним скриптом, без обращения к Postgres;
+    строка сессии в Postgres обновляется в фоне.
+    """
+
+    def __init__(self) -> None:
+        self._rotate = None
+        self._revoke = None
+        self._background: set[asyncio.Task] = set()
+
+    def _register(self, redis: Redis) -> None:
+        if self._rotate is None:
+            self._rotate = redis.register_script(ROTATE_SCRIPT)
+            self._revoke = redis.register_script(REVOKE_SCRIPT)
+
+    @staticmethod
+    def start(pipe: Pipeline, session_id: str, user_id: str, refresh_jwt: dict, access_jwt: dict) -> None:
+        key = SESSION_KEY.format(session_id)
+        pipe.hset(key, mapping={
+            'jti': refresh_jwt['jti'], 'exp': refresh_jwt['exp'],
+            'access_jti': access_jwt['jti'], 'access_exp': access_jwt['exp'],
+        })
+        pipe.expireat(key, refresh_jwt['exp'])
+        pipe.sadd(USER_SESSIONS_KEY.format(user_id), session_id)
+        pipe.expireat(USER_SESSIONS_KEY.format(user_id), refresh_jwt['exp'])
+
+    async def rotate(
+            self, redis: Redis, session_id: str, jti: str, refresh_jwt: dict, access_jwt: dict
+    ) -> tuple[bytes, list[tuple[str, datetime.datetime]]]:
+        """Делает токены refresh_jwt и access_jwt текущими. При повторе возвращает токены сессии для отзыва."""
+        self._register(redis)
+        status, *values = await self._rotate(
+            keys=[SESSION_KEY.format(session_id)],
+            args=[jti, refresh_jwt['jti'], refresh_jwt['exp'], access_jwt['jti'], access_jwt['exp']],
+            client=redis,
+        )
+        return status, _tokens(values)
+
+    async def revoke(self, redis: Redis, session_ids: list[str]) -> list[tuple[str, datetime.datetime]]:
+        """Отзывает сессии одним пайплайном и возвращает их последние токены для отзыва."""
+        if not session_ids:
+            return []
+        self._register(redis)
+        async with redis.pipeline(transaction=False) as pipe:
+            for session_id in session_ids:
+                await self._revoke(keys=[SESSION_KEY.format(session_id)], client=pipe)
+            results = await pipe.execute()
+        return [token for values in results for token in _tokens(values)]
+
+    async def revoke_users(self, redis: Redis, user_ids: list[str]) -> list[tuple[str, datetime.datetime]]:
+        """Отзывает все сессии пользователей двумя пайплайнами и возвращает их последние токены для отзыва."""
+        if not user_ids:
+            return []
+        self._register(redis)
+        # Скрипт обращается только к ключам из KEYS, поэтому сессии пользователя читаются отдельно:
+        # иначе ключи сессий могут оказаться на другом узле Redis Cluster.
+        async with redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.smembers(USER_SESSIONS_KEY.format(user_id))
+            members = await pipe.execute()
+        async with redis.pipeline(transaction=False) as pipe:
+            for user_id, session_ids in zip(user_ids, members):
+                if not session_ids:
+                    continue
+                for session_id in session_ids:
+                    await self._revoke(keys=[SESSION_KEY.format(session_id.decode())], client=pipe)
+                # Удаляем только прочитанные сессии: сессия, начатая в это время, остается в множестве.
+                pipe.srem(USER_SESSIONS_KEY.format(user_id), *session_ids)
+            results = await pipe.execute()
+        return [token for values in results if isinstance(values, list) for token in _tokens(values)]
+
+    def update_later(self, session_id: str, **values) -> None:
+        # Строка сессии нужна только истории входов, поэтому запрос выполняется в фоне.
+        task = asyncio.create_task(self._update(session_id, values))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    @staticmethod
+    async def _update(session_id: str, values: dict) -> None:
+        try:
+            async with async_session() as db:
+                await db.execute(
+                    update(Session).
+                    where(Session.id == session_id).
+                    # Сессия с действующим токеном обновления создана не раньше его времени жизни.
+                    where(Session.created_at >= datetime.datetime.utcnow() - datetime.timedelta(
+                        seconds=project_settings.authjwt_refresh_token_expires)).
+                    values(**values).
+                    execution_options(synchronize_session=False)
+                )
+                await db.commit()
+        except Exception:
+            logger.exception('Failed to update session %s', session_id)
+
+
+refresh_sessions = RefreshSessions()
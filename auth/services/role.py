@@ -1,21 +1,27 @@
-from functools import lru_cache, wraps
+import datetime
+from functools import wraps
 from http import HTTPStatus
 from typing import Optional
 from uuid import UUID
 
-from async_fastapi_jwt_auth import AuthJWT
 from fastapi import Depends, HTTPException
 from fastapi.encoders import jsonable_encoder
 from psycopg.errors import UniqueViolation, ForeignKeyViolation
-from sqlalchemy import delete, select, update
+from redis.asyncio import Redis
+from sqlalchemy import bindparam, delete, func, literal, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID, insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from core.metrics import metered
 from db.postgres import get_session
+from db.redisdb import get_redis
 from models.permission import RolePermission, Permission
 from models.role import Role
-from schemas.permission import PermissionResponse
+from schemas.permission import PermissionResponse, RolePermissionsChanged
 from schemas.role import RoleBase, RoleResponse
+from services.auth_context import AuthContext, get_jwt
+from services.permission_cache import permission_cache
 
 
 def check_access(allow_permission: Permission):
@@ -30,10 +36,12 @@ def check_access(allow_permission: Permission):
     return inner
 
 
+@metered
 class RoleService:
-    def __init__(self, db: AsyncSession, jwt: AuthJWT):
+    def __init__(self, db: AsyncSession, jwt: AuthContext, redis: Redis):
         self.db = db
         self.jwt = jwt
+        self.redis = redis
 
     async def list_roles(self) -> list[RoleResponse]:
         await self.jwt.jwt_required()
@@ -85,6 +93,7 @@ class RoleService:
         await self.jwt.jwt_required()
         result = await self.db.execute(delete(Role).where(Role.id == role_id))
         await self.db.commit()
+        await permission_cache.invalidate(self.redis, [role_id])
         return result.rowcount != 0
 
     async def delete_role_permission(self, role_id: UUID, permission_id: UUID) -> bool:
@@ -93,6 +102,7 @@ class RoleService:
                                          RolePermission.permission_id == permission_id)
         )
         await self.db.commit()
+        await permission_cache.invalidate(self.redis, [role_id])
         return result.rowcount != 0
 
     async def get_role_permissions(self, role_id: UUID) -> list[PermissionResponse]:
@@ -121,16 +131,51 @@ class RoleService:
                     raise HTTPException(status_code=HTTPStatus.BAD_REQUEST,
                                         detail='Role permission already exists')
             raise e
+        await permission_cache.invalidate(self.redis, [role_id])
         await self.db.refresh(permission_role)
 
+    async def set_role_permissions(self, role_id: UUID, permission_ids: list[UUID]) -> RolePermissionsChanged:
+        """Заменяет доступы роли набором permission_ids одной транзакцией, возвращает разницу."""
+        permission_ids = list(dict.fromkeys(permission_ids))
+        # Блокировка роли упорядочивает одновременные замены ее доступов.
+        if not (await self.db.execute(select(Role.id).where(Role.id == role_id).with_for_update())).first():
+            await self.db.rollback()
+            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='Role not found')
+        known = set((await self.db.scalars(select(Permission.id).where(Permission.id.in_(permission_ids)))).all())
+        if len(known) != len(permission_ids):
+            await self.db.rollback()
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail='Permission not found')
+
+        desired = bindparam('permission_ids', permission_ids, type_=ARRAY(PG_UUID(as_uuid=True)))
+        removed = (await self.db.scalars(
+            delete(RolePermission).
+            where(RolePermission.role_id == role_id, RolePermission.permission_id != func.all(desired)).
+            returning(RolePermission.permission_id)
+        )).all()
+        now = datetime.datetime.utcnow()
+        added = (await self.db.scalars(
+            insert(RolePermission).
+            from_select(
+                ['id', 'role_id', 'permission_id', 'created_at', 'modified_at'],
+                select(func.gen_random_uuid(), literal(role_id, PG_UUID(as_uuid=True)), func.unnest(desired),
+                       literal(now), literal(now))
+            ).
+            on_conflict_do_nothing(index_elements=['role_id', 'permission_id']).
+            returning(RolePermission.permission_id)
+        )).all()
+        await self.db.commit()
+        if added or removed:
+            await permission_cache.invalidate(self.redis, [role_id])
+        return RolePermissionsChanged(added=added, removed=removed)
+
     async def get_role_by_id(self, role_id: UUID) -> Role:
         result = await self.db.execute(select(Role).where(Role.id == role_id))
         return result.scalars().first()
 
 
-@lru_cache()
-def get_role_service(
+async def get_role_service(
         db: AsyncSession = Depends(get_session),
-        jwt: AuthJWT = Depends()
+        jwt: AuthContext = Depends(get_jwt),
+        redis: Redis = Depends(get_redis)
 ) -> RoleService:
-    return RoleService(db, jwt)
+    return RoleService(db, jwt, redis)
@@ -0,0 +1,191 @@
+import asyncio
+import datetime
+import logging
+import os
+import socket
+import time
+from uuid import UUID
+
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from redis.exceptions import ResponseError
+from sqlalchemy import func, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+
+from core.config import project_settings
+from db.postgres import async_session
+from models.session import Session
+from services.refresh_sessions import SESSION_KEY
+
+logger = logging.getLogger(__name__)
+
+# Поток новых сессий и группа воркеров, которые пишут их в Postgres.
+JOURNAL_STREAM = 'sessions:journal'
+JOURNAL_GROUP = 'sessions-writer'
+
+UUID_FIELDS = ('id', 'user_id', 'refresh_jti')
+DATETIME_FIELDS = ('expire', 'created_at')
+
+
+class SessionJournal:
+    """
+    Отложенная запись сессий в Postgres.
+
+    Вход кладет сессию в поток Redis тем же пайплайном, что и состояние сессии, и не ждет
+    Postgres. Воркеры читают поток через группу и пишут сессии пачками одним INSERT.
+    Запись подтверждается (XACK) и удаляется из потока только после коммита, необработанные
+    записи упавшего воркера забирает другой через claim_idle мс, а повторная вставка
+    пропускается по первичному ключу - каждая сессия попадает в базу ровно один раз.
+
+    Пока сессия ждет в потоке, ее могут обновить или отозвать, и UPDATE не найдет строку.
+    Поэтому после коммита пачки ротация и отзыв сессии переносятся в строку из состояния
+    сессии в Redis: оно меняется раньше UPDATE, так что изменение не теряется. Имена
+    потребителей пропавших воркеров без необработанных записей удаляются из группы.
+
+    Если поток длиннее max_length (база не успевает или недоступна), вход пишет сессию
+    в Postgres сам, пока очередь не разберут.
+    """
+
+    def __init__(self, enabled: bool, batch_size: int, max_length: int, claim_idle: int) -> None:
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.claim_idle = claim_idle
+        # Длина потока по последнему чтению; None, пока воркер не подключился к потоку.
+        self.length: int | None = None
+
+    @property
+    def consumer(self) -> str:
+        # Имя считается при обращении: с preload_app модуль загружается в мастере gunicorn до fork.
+        return f'{socket.gethostname()}-{os.getpid()}'
+
+    def accepting(self) -> bool:
+        return self.enabled and self.length is not None and self.length < self.max_length
+
+    def append(self, pipe: Pipeline, **values) -> None:
+        pipe.xadd(JOURNAL_STREAM, {
+            field: value.isoformat() if field in DATETIME_FIELDS else str(value) for field, value in values.items()
+        })
+        if self.length is not None:
+            self.length += 1
+
+    @staticmethod
+    def _row(fields: dict) -> dict:
+        row = {field.decode(): value.decode() for field, value in fields.items()}
+        for field in UUID_FIELDS:
+            row[field] = UUID(row[field])
+        for field in DATETIME_FIELDS:
+            row[field] = datetime.datetime.fromisoformat(row[field])
+        row['modified_at'] = row['created_at']
+        return row
+
+    async def _write(self, redis: Redis, entries: list) -> None:
+        if not entries:
+            return
+        rows = [self._row(fields) for _, fields in entries]
+        try:
+            await self._insert(rows)
+        except IntegrityError:
+            # В пачке есть сессия, которую нельзя вставить (пользователь уже удален): пишем по одной.
+            for row in rows:
+                try:
+                    await self._insert([row])
+                except IntegrityError as e:
+                    logger.error('Dropping session %s of user %s: %s', row['id'], row['user_id'], e.orig)
+        await self._merge(redis, rows)
+        ids = [entry_id for entry_id, _ in entries]
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.xack(JOURNAL_STREAM, JOURNAL_GROUP, *ids)
+            pipe.xdel(JOURNAL_STREAM, *ids)
+            await pipe.execute()
+
+    @staticmethod
+    async def _insert(rows: list[dict]) -> None:
+        async with async_session() as db:
+            await db.execute(insert(Session).values(rows).on_conflict_do_nothing(index_elements=['id', 'created_at']))
+            await db.commit()
+
+    @staticmethod
+    async def _merge(redis: Redis, rows: list[dict]) -> None:
+        async with redis.pipeline(transaction=False) as pipe:
+            for row in rows:
+                pipe.hmget(SESSION_KEY.format(row['id']), 'jti', 'revoked')
+            states = await pipe.execute()
+        changed = [
+            (row, jti, revoked) for row, (jti, revoked) in zip(rows, states)
+            if revoked or jti and jti.decode() != str(row['refresh_jti'])
+        ]
+        if not changed:
+            return
+        now = datetime.datetime.utcnow()
+        async with async_session() as db:
+            for row, jti, revoked in changed:
+                values = {'modified_at': now}
+                if jti:
+                    values['refresh_jti'] = UUID(jti.decode())
+                if revoked:
+                    values['revoked_at'] = func.coalesce(Session.revoked_at, now)
+                await db.execute(
+                    update(Session).
+                    where(Session.id == row['id']).
+                    where(Session.created_at == row['created_at']).
+                    values(**values).
+                    execution_options(synchronize_session=False)
+                )
+            await db.commit()
+
+    async def _cleanup(self, redis: Redis) -> None:
+        # Записи пропавшего воркера забирает xautoclaim, после этого его имя больше не нужно.
+        for consumer in await redis.xinfo_consumers(JOURNAL_STREAM, JOURNAL_GROUP):
+            name = consumer['name'].decode()
+            if name != self.consumer and not consumer['pending'] and consumer['idle'] > self.claim_idle:
+                await redis.xgroup_delconsumer(JOURNAL_STREAM, JOURNAL_GROUP, name)
+
+    async def _prepare(self, redis: Redis) -> None:
+        try:
+            await redis.xgroup_create(JOURNAL_STREAM, JOURNAL_GROUP, id='0', mkstream=True)
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+        # Сначала дописываем то, что этот воркер прочитал, но не успел записать.
+        while entries := (await redis.xreadgroup(
+                JOURNAL_GROUP, self.consumer, {JOURNAL_STREAM: '0'}, count=self.batch_size
+        ))[0][1]:
+            await self._write(redis, entries)
+
+    async def consume(self, redis: Redis) -> None:
+        while True:
+            try:
+                await self._prepare(redis)
+                self.length = await redis.xlen(JOURNAL_STREAM)
+                cleanup_at = 0
+                while True:
+                    if time.monotonic() >= cleanup_at:
+                        await self._cleanup(redis)
+                        cleanup_at = time.monotonic() + self.claim_idle / 1000
+                    # Записи воркеров, которые прочитали их и пропали.
+                    claimed = await redis.xautoclaim(
+                        JOURNAL_STREAM, JOURNAL_GROUP, self.consumer, self.claim_idle, count=self.batch_size
+                    )
+                    await self._write(redis, claimed[1])
+                    for _, entries in await redis.xreadgroup(
+                            JOURNAL_GROUP, self.consumer, {JOURNAL_STREAM: '>'}, count=self.batch_size, block=1000
+                    ):
+                        await self._write(redis, entries)
+                    self.length = await redis.xlen(JOURNAL_STREAM)
+            except asyncio.CancelledError:
+                self.length = None
+                raise
+            except Exception:
+                logger.exception('Session journal writer failed, retrying')
+                self.length = None
+                await asyncio.sleep(1)
+
+
+session_journal = SessionJournal(
+    project_settings.session_journal,
+    project_settings.session_journal_batch,
+    project_settings.session_journal_max_length,
+    project_settings.session_journal_claim_idle,
+)
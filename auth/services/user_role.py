@@ -1,23 +1,28 @@
-from functools import lru_cache
+import datetime
 from http import HTTPStatus
 from uuid import UUID
 
-from async_fastapi_jwt_auth import AuthJWT
 from fastapi import Depends, HTTPException
 from psycopg.errors import UniqueViolation, ForeignKeyViolation
-from sqlalchemy import delete, select
+from sqlalchemy import bindparam, column, delete, func, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 
+from core.metrics import metered
 from db.postgres import get_session
-from models.permission import Permission, RolePermission
-from models.role import UserRole
+from models.permission import Permission
+from models.role import Role, UserRole
 from models.user import User
+from schemas.role import UserRoleFailed, UserRolePair, UserRolesAssigned
 from services.auth import AuthService, get_auth_service
+from services.auth_context import AuthContext, get_jwt
+from services.permission_cache import permission_cache
 
 
+@metered
 class UserRoleService:
-    def __init__(self, db: AsyncSession, auth_service: AuthService, jwt: AuthJWT):
+    def __init__(self, db: AsyncSession, auth_service: AuthService, jwt: AuthContext):
         self.db = db
         self.auth_service = auth_service
         self.jwt = jwt
@@ -58,6 +63,63 @@ class UserRoleService:
             raise e
         await self.auth_service.logout(user_id)
 
+    async def assign_user_roles(self, pairs: list[UserRolePair]) -> UserRolesAssigned:
+        """
+        Назначает пачку ролей одним INSERT ... ON CONFLICT DO NOTHING.
+
+        Пары с несуществующими пользователем или ролью не вставляются и попадают в failed.
+        Сессии пользователей, получивших новые роли, завершаются одним запросом и одним пайплайном.
+        """
+        pairs = list(dict.fromkeys((pair.user_id, pair.role_id) for pair in pairs))
+        uuids = ARRAY(PG_UUID(as_uuid=True))
+        requested = func.unnest(
+            bindparam('user_ids', [user_id for user_id, _ in pairs], type_=uuids),
+            bindparam('role_ids', [role_id for _, role_id in pairs], type_=uuids),
+        ).table_valued(column('user_id', PG_UUID(as_uuid=True)), column('role_id', PG_UUID(as_uuid=True)))
+        now = datetime.datetime.utcnow()
+        inserted = set(map(tuple, await self.db.execute(
+            insert(UserRole).
+            from_select(
+                ['id', 'user_id', 'role_id', 'created_at', 'modified_at'],
+                select(func.gen_random_uuid(), requested.c.user_id, requested.c.role_id, literal(now), literal(now)).
+                select_from(requested).
+                join(User, User.id == requested.c.user_id).
+                join(Role, Role.id == requested.c.role_id).
+                # Пользователь или роль не удалятся до конца транзакции.
+                with_for_update(read=True, key_share=True, of=[User, Role])
+            ).
+            on_conflict_do_nothing(index_elements=['user_id', 'role_id']).
+            returning(UserRole.user_id, UserRole.role_id)
+        )))
+
+        rejected = [pair for pair in pairs if pair not in inserted]
+        users, roles = set(), set()
+        if rejected:
+            users = set((await self.db.scalars(
+                select(User.id).where(User.id.in_({user_id for user_id, _ in rejected}))
+            )).all())
+            roles = set((await self.db.scalars(
+                select(Role.id).where(Role.id.in_({role_id for _, role_id in rejected}))
+            )).all())
+        await self.db.commit()
+
+        result = UserRolesAssigned(assigned=[], existing=[], failed=[])
+        for user_id, role_id in pairs:
+            pair = {'user_id': user_id, 'role_id': role_id}
+            if (user_id, role_id) in inserted:
+                result.assigned.append(UserRolePair(**pair))
+            elif user_id not in users:
+                result.failed.append(UserRoleFailed(**pair, detail='User not found'))
+            elif role_id not in roles:
+                result.failed.append(UserRoleFailed(**pair, detail='Role not found'))
+            else:
+                result.existing.append(UserRolePair(**pair))
+
+        # Роли попадают в токены при входе: пользователи с новыми ролями входят заново.
+        tokens = await self.auth_service.end_sessions(list({user_id for user_id, _ in inserted}))
+        await self.auth_service.revoke_tokens(list(dict(tokens).items()))
+        return result
+
     async def delete_user_role(
             self, user_id: UUID, role_id: UUID
     ) -> bool:
@@ -70,34 +132,32 @@ class UserRoleService:
         return result.rowcount != 0
 
     async def check_access(self, allow_permission: Permission = None) -> None:
-        await self.jwt.jwt_required()
+        access_jwt = await self.jwt.get_access_claims()
 
         if allow_permission is None:
             return
 
-        access_jwt = await self.jwt.get_raw_jwt()
-        roles_jwt = access_jwt['roles']
-        result = (await self.db.execute(
-                      select(RolePermission.permission_id).
-                      where(RolePermission.role_id.in_(roles_jwt))
-                  )).scalars().all()
-
-        if not set(allow_permission.id) & set(result):
+        redis = self.auth_service.redis
+        # Версию сверяем со счетчиком в Redis, а не с копией воркера: копия отстает на доставку pub/sub.
+        if 'permissions' in access_jwt and \
+                access_jwt['permissions_version'] == await permission_cache.get_version(redis):
+            # Доступы в токене актуальны: проверка без обращения к базе.
+            allowed = permission_cache.mask_allows(access_jwt['permissions'], allow_permission)
+        else:
+            roles_jwt = access_jwt['roles']
+            allowed = allow_permission.id in await permission_cache.get_permissions(self.db, redis, roles_jwt)
+
+        if not allowed:
             raise HTTPException(status_code=HTTPStatus.FORBIDDEN,
                                 detail='Insufficient permissions')
 
     async def is_superuser(self) -> bool:
-        await self.jwt.jwt_required()
-
-        access_jwt = await self.jwt.get_raw_jwt()
-
-        return access_jwt['superuser']
+        return (await self.jwt.get_access_claims())['superuser']
 
 
-@lru_cache()
-def get_user_role_service(
+async def get_user_role_service(
         db: AsyncSession = Depends(get_session),
         auth_service: AuthService = Depends(get_auth_service),
-        jwt: AuthJWT = Depends()
+        jwt: AuthContext = Depends(get_jwt)
 ) -> UserRoleService:
     return UserRoleService(db, auth_service, jwt)
@@ -1,4 +1,9 @@
 #!/usr/bin/env bash
 alembic upgrade head
+PYTHONPATH=. python cli/sessions_partitions.py --ahead 3
+
+# Метрики воркеров gunicorn собираются через общий каталог, см. core/metrics.py.
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
 
 gunicorn main:app
\ No newline at end of file
@@ -0,0 +1,18 @@
+import math
+import os
+from pathlib import Path
+
+# Квота CPU контейнера в cgroup v2: "<квота> <период>" или "max <период>".
+CGROUP_CPU_MAX = Path('/sys/fs/cgroup/cpu.max')
+
+
+def available_cpus() -> int:
+    """Число ядер, доступных процессу, с учетом привязки к ядрам и квоты CPU контейнера (docker --cpus)."""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    try:
+        quota, period = CGROUP_CPU_MAX.read_text().split()
+        if quota != 'max':
+            cpus = min(cpus, max(math.ceil(int(quota) / int(period)), 1))
+    except (OSError, ValueError):
+        pass
+    return cpus
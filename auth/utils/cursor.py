@@ -0,0 +1,17 @@
+import base64
+import binascii
+from datetime import datetime
+from uuid import UUID
+
+
+def encode_cursor(created_at: datetime, id_: UUID) -> str:
+    return base64.urlsafe_b64encode(f'{created_at.isoformat()}|{id_}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """Разбирает курсор пагинации, ValueError для некорректного курсора."""
+    try:
+        created_at, id_ = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().split('|')
+        return datetime.fromisoformat(created_at), UUID(id_)
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
@@ -1,21 +1,44 @@
-from fastapi.encoders import jsonable_encoder
-from sqlalchemy import insert, select
+import json
+import os
+from uuid import UUID
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
 
 from db.postgres import async_session
 from models.permission import Permission, permissions
 
+# Ключ advisory-блокировки, под которой заполняется таблица доступов.
+PERMISSIONS_LOCK_KEY = 6_000_017
+# Переменная окружения, через которую мастер gunicorn передает воркерам идентификаторы доступов.
+PERMISSION_IDS_ENV = 'AUTH_PERMISSION_IDS'
+
 
-async def create_permissions() -> Permission:
+async def seed_permissions(names: list[str]) -> dict[str, UUID]:
+    """Создает недостающие доступы одним INSERT и возвращает идентификаторы всех доступов по имени."""
     async with async_session() as db:
-        for permission in permissions:
-            permission_db_id = (
-                await db.execute(select(Permission.id).where(Permission.name == permission.name))).first()
-            if not permission_db_id:
-                values = jsonable_encoder(permission)
-                permission_db_id = (await db.execute(insert(Permission).
-                                                     values(values).
-                                                     returning(Permission.id))
-                                    ).first()
-                await db.commit()
-            permission.id = permission_db_id
+        # Одновременно стартующие процессы заполняют таблицу по очереди; блокировка снимается при COMMIT.
+        await db.execute(select(func.pg_advisory_xact_lock(PERMISSIONS_LOCK_KEY)))
+        ids = dict((await db.execute(
+            insert(Permission).
+            values([{'name': name} for name in names]).
+            on_conflict_do_nothing(index_elements=['name']).
+            returning(Permission.name, Permission.id)
+        )).all())
+        if missing := [name for name in names if name not in ids]:
+            ids.update((await db.execute(
+                select(Permission.name, Permission.id).where(Permission.name.in_(missing))
+            )).all())
+        await db.commit()
+    return ids
+
+
+async def create_permissions() -> list[Permission]:
+    # Под gunicorn доступы создает мастер (gunicorn.conf.py), воркер берет готовые идентификаторы.
+    if shared := os.environ.get(PERMISSION_IDS_ENV):
+        ids = {name: UUID(permission_id) for name, permission_id in json.loads(shared).items()}
+    else:
+        ids = await seed_permissions([permission.name for permission in permissions])
+    for permission in permissions:
+        permission.id = ids[permission.name]
     return permissions
@@ -0,0 +1,51 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Optional
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from core.config import hashing_settings
+from core.metrics import PASSWORD_HASH_DURATION, measure
+from utils.cpu import available_cpus
+
+executor: Optional[Executor] = None
+
+
+def get_executor() -> Executor:
+    # Пул создается лениво, один на воркер.
+    global executor
+    if executor is None:
+        workers = hashing_settings.workers or available_cpus()
+        if hashing_settings.executor == 'process':
+            executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hashing')
+    return executor
+
+
+def shutdown_executor() -> None:
+    global executor
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+        executor = None
+
+
+async def hash_password(password: str) -> str:
+    with measure(PASSWORD_HASH_DURATION.labels('hash'), 'hashing'):
+        return await asyncio.get_running_loop().run_in_executor(
+            get_executor(),
+            partial(
+                generate_password_hash,
+                password,
+                method=hashing_settings.get_method(),
+                salt_length=hashing_settings.salt_length,
+            )
+        )
+
+
+async def verify_password(password_hash: str, password: str) -> bool:
+    with measure(PASSWORD_HASH_DURATION.labels('verify'), 'hashing'):
+        return await asyncio.get_running_loop().run_in_executor(
+            get_executor(), check_password_hash, password_hash, password
+        )
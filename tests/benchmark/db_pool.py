@@ -0,0 +1,70 @@
+"""
+Пропускная способность запросов истории входов при прежних настройках движка и при настроенном пуле.
+
+Прежние настройки: echo=True и пул SQLAlchemy по умолчанию (5 + 10). Настроенные берутся из
+PostgresSettings (переменные окружения POSTGRES_*). Нагрузка - CONCURRENCY сопрограмм,
+выполняющих запрос истории входов в течение DURATION секунд. Лог echo пишется, как в сервисе.
+
+    PYTHONPATH=auth python tests/benchmark/db_pool.py 2>&1 | grep -E 'concurrency=|queries/s='
+"""
+import asyncio
+import statistics
+import time
+import uuid
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from core.config import postgres_settings
+from models import Session
+
+CONCURRENCY = 100
+DURATION = 20
+
+
+async def worker(session_factory: async_sessionmaker, deadline: float, latencies: list[float]) -> None:
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        async with session_factory() as db:
+            await db.scalars(
+                select(Session).
+                where(Session.user_id == uuid.uuid4()).
+                order_by(Session.created_at.desc(), Session.id.desc()).
+                limit(100)
+            )
+        latencies.append(time.perf_counter() - started)
+
+
+async def run(name: str, **engine_options) -> None:
+    engine = create_async_engine(**engine_options)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    # Прогрев соединений пула.
+    async with session_factory() as db:
+        await db.scalars(select(Session).limit(1))
+
+    latencies = []
+    deadline = time.perf_counter() + DURATION
+    await asyncio.gather(*(worker(session_factory, deadline, latencies) for _ in range(CONCURRENCY)))
+    await engine.dispose()
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(
+        f'{name:10} queries/s={len(latencies) / DURATION:9.1f} '
+        f'p50={quantiles[49] * 1000:7.2f}ms p99={quantiles[98] * 1000:7.2f}ms'
+    )
+
+
+async def main() -> None:
+    connection_info = postgres_settings.get_connection_info()
+    print(f'concurrency={CONCURRENCY} duration={DURATION}s')
+    await run(
+        'default',
+        url=connection_info['url'],
+        connect_args={'options': connection_info['connect_args']['options']},
+        echo=True,
+    )
+    await run('tuned', **connection_info, echo=postgres_settings.echo)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,59 @@
+"""
+Накладные расходы на разрешение зависимостей сервисов за запрос.
+
+Сравнивает эндпоинт без зависимостей и эндпоинт, получающий RoleService и UserRoleService
+(а через них AuthService, AuthJWT, сессию и Redis), как эндпоинты api/v1/roles.py.
+Сессия Postgres создается, но соединение из пула не берется, так как запросов нет.
+
+    PYTHONPATH=auth python tests/benchmark/dependency_resolution.py
+"""
+import asyncio
+import logging
+import time
+
+from fastapi import Depends, FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from services.role import RoleService, get_role_service
+from services.user_role import UserRoleService, get_user_role_service
+
+REQUESTS = 5000
+
+app = FastAPI()
+
+
+@app.get('/bare')
+async def bare() -> None:
+    return None
+
+
+@app.get('/services')
+async def services(
+        role_service: RoleService = Depends(get_role_service),
+        user_role_service: UserRoleService = Depends(get_user_role_service),
+) -> None:
+    return None
+
+
+async def measure(client: AsyncClient, url: str) -> float:
+    for _ in range(100):
+        await client.get(url)
+    started = time.perf_counter()
+    for _ in range(REQUESTS):
+        await client.get(url)
+    return (time.perf_counter() - started) / REQUESTS
+
+
+async def main() -> None:
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url='http://bench') as client:
+        bare_time = await measure(client, '/bare')
+        services_time = await measure(client, '/services')
+    print(f'requests={REQUESTS}')
+    print(f'no dependencies   {bare_time * 1e6:8.1f} us/request')
+    print(f'service injection {services_time * 1e6:8.1f} us/request')
+    print(f'overhead          {(services_time - bare_time) * 1e6:8.1f} us/request')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,397 @@
+"""
+Нагрузочный набор по всем ручкам аутентификации и управления ролями.
+
+Приложение main.app запускается в процессе вместе с lifespan, запросы идут через
+httpx.ASGITransport без сети. Postgres - локальный с примененными миграциями, вместо Redis
+подставляется fakeredis. Каждый тест - сценарий одной ручки: BENCHMARK_CONCURRENCY
+виртуальных пользователей в течение BENCHMARK_DURATION секунд повторяют запрос, подготовка
+(вход, создание роли) в задержку не входит. По окончании число запросов в секунду и задержки
+p50/p95/p99 всех сценариев пишутся в JSON BENCHMARK_REPORT, чтобы сравнивать релизы.
+Созданные пользователи и роли удаляются по окончании.
+
+Файл не собирается функциональными тестами, его передают pytest явно:
+
+    pip install -r tests/benchmark/requirements.txt
+    PYTHONPATH=. pytest -s tests/benchmark/endpoints.py
+    PYTHONPATH=. pytest -s tests/benchmark/endpoints.py -k role
+"""
+import asyncio
+import datetime
+import json
+import os
+import statistics
+import time
+import uuid
+from contextlib import AsyncExitStack
+from typing import Awaitable, Callable
+
+import httpx
+import pytest
+from fakeredis.aioredis import FakeRedis
+from sqlalchemy import delete, select
+
+import main
+from db.postgres import async_session, engine
+from models.permission import RolePermission, role_management, user_management
+from models.role import Role, UserRole
+from models.user import User
+from services.login_throttle import login_throttle
+
+CONCURRENCY = int(os.environ.get('BENCHMARK_CONCURRENCY', 16))
+DURATION = float(os.environ.get('BENCHMARK_DURATION', 5))
+REPORT = os.environ.get('BENCHMARK_REPORT', 'benchmark-report.json')
+PREFIX = f'bench_{uuid.uuid4().hex[:8]}'
+PASSWORD = 'qwerty'
+
+
+class Load:
+    """Виртуальные пользователи, повторяющие сценарий, и задержки отмеченных в нем запросов."""
+
+    def __init__(self) -> None:
+        self.latencies: list[float] = []
+        self.errors = 0
+
+    async def timed(self, request: Awaitable[httpx.Response], status: int = 200) -> httpx.Response:
+        started = time.perf_counter()
+        response = await request
+        self.latencies.append(time.perf_counter() - started)
+        if response.status_code != status:
+            self.errors += 1
+        return response
+
+    async def run(self, scenario: Callable, concurrency: int, duration: float) -> dict:
+        async def user(state: dict) -> None:
+            while time.perf_counter() < deadline:
+                await scenario(self, state)
+
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        await asyncio.gather(*(user({'index': i}) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        quantiles = statistics.quantiles(self.latencies, n=100) if len(self.latencies) > 1 else [0] * 99
+        return {
+            'requests': len(self.latencies),
+            'errors': self.errors,
+            'rps': round(len(self.latencies) / elapsed, 1),
+            'mean_ms': round(statistics.fmean(self.latencies or [0]) * 1000, 2),
+            'p50_ms': round(quantiles[49] * 1000, 2),
+            'p95_ms': round(quantiles[94] * 1000, 2),
+            'p99_ms': round(quantiles[98] * 1000, 2),
+        }
+
+
+def bearer(token: str) -> dict:
+    return {'Authorization': f'Bearer {token}'}
+
+
+async def signup(client: httpx.AsyncClient, login: str) -> httpx.Response:
+    return await client.post('/api/v1/auth/signup', json={
+        'login': login, 'password': PASSWORD, 'first_name': 'bench', 'last_name': 'bench',
+        'email': f'{login}@example.com',
+    })
+
+
+async def login(client: httpx.AsyncClient, login_name: str) -> dict:
+    response = await client.post('/api/v1/auth/login', json={'login': login_name, 'password': PASSWORD})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def user_id(login_name: str) -> uuid.UUID:
+    async with async_session() as db:
+        return (await db.execute(select(User.id).where(User.login == login_name))).scalar()
+
+
+@pytest.fixture(scope='session')
+def loop() -> asyncio.AbstractEventLoop:
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope='session')
+def client(loop) -> httpx.AsyncClient:
+    async def start(stack: AsyncExitStack) -> httpx.AsyncClient:
+        stack.push_async_callback(engine.dispose)
+        await stack.enter_async_context(main.lifespan(main.app))
+        return await stack.enter_async_context(
+            httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url='http://auth')
+        )
+
+    stack = AsyncExitStack()
+    with pytest.MonkeyPatch.context() as patch:
+        # lifespan подключается к fakeredis вместо Redis.
+        patch.setattr(main, 'MeteredRedis', FakeRedis)
+        # Сценарии входят одними и теми же пользователями, ограничение частоты входов им мешает.
+        patch.setattr(login_throttle, 'enabled', False)
+        yield loop.run_until_complete(start(stack))
+        loop.run_until_complete(stack.aclose())
+
+
+@pytest.fixture(scope='session')
+def users(loop, client) -> list[str]:
+    """Логины виртуальных пользователей и администратора (последний) с ролью управления ролями и пользователями."""
+    async def create() -> list[str]:
+        logins = [f'{PREFIX}_user_{i}' for i in range(CONCURRENCY + 1)]
+        for login_name in logins:
+            assert (await signup(client, login_name)).status_code == 201
+        async with async_session() as db:
+            # Администратор - обычный пользователь с доступами, чтобы запросы проходили проверку доступа.
+            role = Role(name=f'{PREFIX}_admin')
+            db.add(role)
+            await db.flush()
+            db.add_all([
+                RolePermission(role_id=role.id, permission_id=permission.id)
+                for permission in (role_management, user_management)
+            ])
+            db.add(UserRole(
+                user_id=(await db.execute(select(User.id).where(User.login == logins[-1]))).scalar(), role_id=role.id
+            ))
+            await db.commit()
+        return logins
+
+    async def cleanup() -> None:
+        async with async_session() as db:
+            await db.execute(delete(User).where(User.login.startswith(PREFIX)))
+            await db.execute(delete(Role).where(Role.name.startswith(PREFIX)))
+            await db.commit()
+
+    try:
+        yield loop.run_until_complete(create())
+    finally:
+        loop.run_until_complete(cleanup())
+
+
+@pytest.fixture(scope='session')
+def report() -> dict:
+    results = {}
+    yield results
+    with open(REPORT, 'w') as file:
+        json.dump({
+            'created_at': datetime.datetime.utcnow().isoformat(),
+            'concurrency': CONCURRENCY,
+            'duration': DURATION,
+            'scenarios': results,
+        }, file, indent=2)
+    print(f'\nReport written to {REPORT}')
+
+
+@pytest.fixture
+def run(loop, client, users, report) -> Callable[[str, Callable], dict]:
+    def inner(name: str, scenario: Callable) -> dict:
+        result = loop.run_until_complete(Load().run(scenario, CONCURRENCY, DURATION))
+        report[name] = result
+        print(f'\n{name:24} ' + ' '.join(f'{key}={value}' for key, value in result.items()))
+        return result
+
+    return inner
+
+
+@pytest.fixture
+def admin(client, users) -> Callable[[dict], Awaitable[dict]]:
+    async def inner(state: dict) -> dict:
+        # Заголовок администратора виртуального пользователя, вход при первом обращении.
+        if 'admin' not in state:
+            state['admin'] = bearer((await login(client, users[-1]))['access_token'])
+        return state['admin']
+
+    return inner
+
+
+def test_signup(run, client):
+    async def scenario(load: Load, state: dict) -> None:
+        await load.timed(signup(client, f'{PREFIX}_signup_{uuid.uuid4().hex}'), 201)
+
+    assert run('signup', scenario)['errors'] == 0
+
+
+def test_login(run, client, users):
+    async def scenario(load: Load, state: dict) -> None:
+        await load.timed(client.post(
+            '/api/v1/auth/login', json={'login': users[state['index']], 'password': PASSWORD}
+        ))
+
+    assert run('login', scenario)['errors'] == 0
+
+
+def test_refresh(run, client, users):
+    async def scenario(load: Load, state: dict) -> None:
+        if 'refresh_token' not in state:
+            state['refresh_token'] = (await login(client, users[state['index']]))['refresh_token']
+        response = await load.timed(client.post('/api/v1/auth/refresh', headers=bearer(state['refresh_token'])))
+        if response.status_code == 200:
+            state['refresh_token'] = response.json()['refresh_token']
+        else:
+            state.pop('refresh_token')
+
+    assert run('refresh', scenario)['errors'] == 0
+
+
+def test_profile(run, client, users):
+    async def scenario(load: Load, state: dict) -> None:
+        if 'access_token' not in state:
+            state['access_token'] = (await login(client, users[state['index']]))['access_token']
+        await load.timed(client.get('/api/v1/auth/profile', headers=bearer(state['access_token'])))
+
+    assert run('profile', scenario)['errors'] == 0
+
+
+def test_history(run, client, users):
+    async def scenario(load: Load, state: dict) -> None:
+        if 'access_token' not in state:
+            state['access_token'] = (await login(client, users[state['index']]))['access_token']
+        await load.timed(client.get('/api/v1/auth/history', headers=bearer(state['access_token'])))
+
+    assert run('history', scenario)['errors'] == 0
+
+
+def test_logout(run, client, users):
+    async def scenario(load: Load, state: dict) -> None:
+        tokens = await login(client, users[state['index']])
+        await load.timed(client.post('/api/v1/auth/logout', headers=bearer(tokens['access_token'])))
+
+    assert run('logout', scenario)['errors'] == 0
+
+
+def test_refresh_revoke(run, client, users):
+    async def scenario(load: Load, state: dict) -> None:
+        tokens = await login(client, users[state['index']])
+        await load.timed(client.delete('/api/v1/auth/refresh-revoke', headers=bearer(tokens['refresh_token'])))
+
+    assert run('refresh_revoke', scenario)['errors'] == 0
+
+
+def test_access_revoke(run, client, users):
+    async def scenario(load: Load, state: dict) -> None:
+        tokens = await login(client, users[state['index']])
+        await load.timed(client.delete('/api/v1/auth/access-revoke', headers=bearer(tokens['access_token'])))
+
+    assert run('access_revoke', scenario)['errors'] == 0
+
+
+async def create_role(client: httpx.AsyncClient, headers: dict) -> str:
+    response = await client.post('/api/v1/roles', json={'name': f'{PREFIX}_role_{uuid.uuid4().hex}'}, headers=headers)
+    assert response.status_code == 201, response.text
+    return response.json()['id']
+
+
+def test_role_create(run, client, admin):
+    async def scenario(load: Load, state: dict) -> None:
+        await load.timed(client.post(
+            '/api/v1/roles', json={'name': f'{PREFIX}_role_{uuid.uuid4().hex}'}, headers=await admin(state)
+        ), 201)
+
+    assert run('role_create', scenario)['errors'] == 0
+
+
+def test_role_list(run, client, admin):
+    async def scenario(load: Load, state: dict) -> None:
+        await load.timed(client.get('/api/v1/roles', headers=await admin(state)))
+
+    assert run('role_list', scenario)['errors'] == 0
+
+
+def test_role_patch(run, client, admin):
+    async def scenario(load: Load, state: dict) -> None:
+        headers = await admin(state)
+        if 'role_id' not in state:
+            state['role_id'] = await create_role(client, headers)
+        await load.timed(client.patch(
+            f'/api/v1/roles/{state["role_id"]}', json={'name': f'{PREFIX}_role_{uuid.uuid4().hex}'}, headers=headers
+        ))
+
+    assert run('role_patch', scenario)['errors'] == 0
+
+
+def test_role_delete(run, client, admin):
+    async def scenario(load: Load, state: dict) -> None:
+        headers = await admin(state)
+        role_id = await create_role(client, headers)
+        await load.timed(client.delete(f'/api/v1/roles/{role_id}', headers=headers), 204)
+
+    assert run('role_delete', scenario)['errors'] == 0
+
+
+def test_role_permissions_get(run, client, admin):
+    async def scenario(load: Load, state: dict) -> None:
+        headers = await admin(state)
+        if 'role_id' not in state:
+            state['role_id'] = await create_role(client, headers)
+            await client.post(f'/api/v1/roles/{state["role_id"]}/permissions/{role_management.id}', headers=headers)
+        await load.timed(client.get(f'/api/v1/roles/{state["role_id"]}/permissions', headers=headers))
+
+    assert run('role_permissions_get', scenario)['errors'] == 0
+
+
+def test_role_permission_assign(run, client, admin):
+    async def scenario(load: Load, state: dict) -> None:
+        headers = await admin(state)
+        role_id = await create_role(client, headers)
+        await load.timed(client.post(f'/api/v1/roles/{role_id}/permissions/{role_management.id}', headers=headers), 201)
+
+    assert run('role_permission_assign', scenario)['errors'] == 0
+
+
+def test_role_permission_delete(run, client, admin):
+    async def scenario(load: Load, state: dict) -> None:
+        headers = await admin(state)
+        role_id = await create_role(client, headers)
+        await client.post(f'/api/v1/roles/{role_id}/permissions/{role_management.id}', headers=headers)
+        await load.timed(client.delete(
+            f'/api/v1/roles/{role_id}/permissions/{role_management.id}', headers=headers
+        ), 204)
+
+    assert run('role_permission_delete', scenario)['errors'] == 0
+
+
+def test_role_permissions_set(run, client, admin):
+    async def scenario(load: Load, state: dict) -> None:
+        headers = await admin(state)
+        role_id = await create_role(client, headers)
+        await load.timed(client.put(f'/api/v1/roles/{role_id}/permissions', json={'permission_ids': [
+            str(role_management.id), str(user_management.id)
+        ]}, headers=headers))
+
+    assert run('role_permissions_set', scenario)['errors'] == 0
+
+
+def test_user_role_assign(run, client, admin, users):
+    async def scenario(load: Load, state: dict) -> None:
+        headers = await admin(state)
+        if 'user_id' not in state:
+            state['user_id'] = await user_id(users[state['index']])
+        role_id = await create_role(client, headers)
+        await load.timed(client.post(f'/api/v1/users/{state["user_id"]}/roles/{role_id}', headers=headers), 201)
+        # Назначение роли завершает сессии пользователя и отзывает токен доступа администратора.
+        state.pop('admin')
+
+    assert run('user_role_assign', scenario)['errors'] == 0
+
+
+def test_user_role_delete(run, client, admin, users):
+    async def scenario(load: Load, state: dict) -> None:
+        headers = await admin(state)
+        if 'user_id' not in state:
+            state['user_id'] = await user_id(users[state['index']])
+        role_id = await create_role(client, headers)
+        await client.post(f'/api/v1/users/{state["user_id"]}/roles/{role_id}', headers=headers)
+        # Назначение и отзыв роли завершают сессии пользователя и отзывают токен доступа администратора.
+        state.pop('admin')
+        headers = await admin(state)
+        await load.timed(client.delete(f'/api/v1/users/{state["user_id"]}/roles/{role_id}', headers=headers), 204)
+        state.pop('admin')
+
+    assert run('user_role_delete', scenario)['errors'] == 0
+
+
+def test_user_roles_bulk_assign(run, client, admin, users):
+    async def scenario(load: Load, state: dict) -> None:
+        headers = await admin(state)
+        if 'user_ids' not in state:
+            state['user_ids'] = [str(await user_id(login_name)) for login_name in users[:-1]]
+        role_id = await create_role(client, headers)
+        await load.timed(client.post('/api/v1/users/roles', json={'user_roles': [
+            {'user_id': identifier, 'role_id': role_id} for identifier in state['user_ids']
+        ]}, headers=headers))
+
+    assert run('user_roles_bulk_assign', scenario)['errors'] == 0
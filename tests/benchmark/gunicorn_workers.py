@@ -0,0 +1,147 @@
+"""
+Пропускная способность GET /api/v1/auth/profile при разных настройках gunicorn.
+
+Для каждой конфигурации из CONFIGURATIONS запускает сервис командой gunicorn с gunicorn.conf.py
+на порту PORT, входит пользователем и нагружает профиль CONCURRENCY соединениями
+keep-alive в течение DURATION секунд. Клиент - сырые HTTP/1.1-запросы на asyncio, чтобы
+замер упирался в сервер, а не в разбор ответов клиентом. Печатает запросы в секунду и p50/p99.
+Пароль хэшируется дешевым методом. Пользователь и его сессии удаляются по окончании.
+
+Запускается из каталога сервиса (рядом с gunicorn.conf.py):
+
+    PYTHONPATH=. python tests/benchmark/gunicorn_workers.py
+"""
+import asyncio
+import json
+import os
+import signal
+import statistics
+import subprocess
+import time
+import uuid
+
+from sqlalchemy import delete
+from werkzeug.security import generate_password_hash
+
+from db.postgres import async_session, engine
+from models.session import Session
+from models.user import User
+
+CONCURRENCY = 64
+DURATION = 10
+PORT = 8765
+PASSWORD = 'qwerty'
+SERVER_ENV = {'GUNICORN_HOST': '127.0.0.1', 'GUNICORN_PORT': str(PORT), 'GUNICORN_LOGLEVEL': 'warning'}
+H11 = 'uvicorn.workers.UvicornH11Worker'
+UVLOOP = 'uvicorn.workers.UvicornWorker'
+# Название и переменные окружения GunicornSettings. Без GUNICORN_WORKERS - по числу ядер.
+CONFIGURATIONS = [
+    ('h11, 1 worker', {'GUNICORN_WORKER_CLASS': H11, 'GUNICORN_WORKERS': '1'}),
+    ('uvloop+httptools, 1 worker', {'GUNICORN_WORKER_CLASS': UVLOOP, 'GUNICORN_WORKERS': '1'}),
+    ('h11, auto workers', {'GUNICORN_WORKER_CLASS': H11}),
+    ('uvloop+httptools, auto workers', {'GUNICORN_WORKER_CLASS': UVLOOP}),
+    ('uvloop+httptools, auto workers, preload', {'GUNICORN_WORKER_CLASS': UVLOOP, 'GUNICORN_PRELOAD_APP': 'true'}),
+]
+
+
+async def request(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter, data: bytes
+) -> tuple[int, bytes]:
+    writer.write(data)
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    headers = dict(line.lower().split(': ', 1) for line in lines[1:] if line)
+    body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return int(lines[0].split()[1]), body
+
+
+def build(method: str, path: str, headers: dict | None = None, body: bytes = b'') -> bytes:
+    headers = {'Host': f'127.0.0.1:{PORT}', 'Content-Length': str(len(body))} | (headers or {})
+    return (
+        f'{method} {path} HTTP/1.1\r\n' + ''.join(f'{key}: {value}\r\n' for key, value in headers.items()) + '\r\n'
+    ).encode() + body
+
+
+async def wait_ready(timeout: float = 60) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', PORT)
+            status, _ = await request(reader, writer, build('GET', '/api/openapi.json'))
+            writer.close()
+            if status == 200:
+                return
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError('gunicorn did not start')
+
+
+async def login(login_name: str) -> str:
+    reader, writer = await asyncio.open_connection('127.0.0.1', PORT)
+    body = json.dumps({'login': login_name, 'password': PASSWORD}).encode()
+    status, response = await request(
+        reader, writer, build('POST', '/api/v1/auth/login', {'Content-Type': 'application/json'}, body)
+    )
+    writer.close()
+    assert status == 200, response
+    return json.loads(response)['access_token']
+
+
+async def client(data: bytes, deadline: float, latencies: list[float], errors: list[int]) -> None:
+    reader, writer = await asyncio.open_connection('127.0.0.1', PORT)
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        status, _ = await request(reader, writer, data)
+        latencies.append(time.perf_counter() - started)
+        if status != 200:
+            errors[0] += 1
+    writer.close()
+
+
+async def measure(name: str, env: dict, login_name: str) -> None:
+    server = subprocess.Popen(
+        ['gunicorn', 'main:app', '-c', 'gunicorn.conf.py'],
+        env=os.environ | SERVER_ENV | env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        started = time.perf_counter()
+        await wait_ready()
+        boot = time.perf_counter() - started
+        data = build('GET', '/api/v1/auth/profile', {'Authorization': f'Bearer {await login(login_name)}'})
+        latencies, errors = [], [0]
+        deadline = time.perf_counter() + DURATION
+        await asyncio.gather(*(client(data, deadline, latencies, errors) for _ in range(CONCURRENCY)))
+        quantiles = statistics.quantiles(latencies, n=100)
+        print(
+            f'{name:42} boot={boot:.1f}s rps={len(latencies) / DURATION:.0f} '
+            f'p50={quantiles[49] * 1000:.1f}ms p99={quantiles[98] * 1000:.1f}ms errors={errors[0]}'
+        )
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+
+async def main() -> None:
+    user = User(
+        login=f'bench_{uuid.uuid4().hex[:8]}', password=generate_password_hash(PASSWORD, method='pbkdf2:sha256:1'),
+        first_name='bench', last_name='bench', email=None
+    )
+    async with async_session() as db:
+        db.add(user)
+        await db.commit()
+    try:
+        print(f'cpu={os.cpu_count()} concurrency={CONCURRENCY} duration={DURATION}s')
+        for name, env in CONFIGURATIONS:
+            await measure(name, env, user.login)
+    finally:
+        async with async_session() as db:
+            await db.execute(delete(Session).where(Session.user_id == user.id))
+            await db.execute(delete(User).where(User.id == user.id))
+            await db.commit()
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+"""
+Пропускная способность запросов при записи логов из цикла событий и через очередь с потоком записи.
+
+Приложение запускается в процессе (httpx.ASGITransport, Redis и Postgres настоящие).
+CONCURRENCY сопрограмм в течение DURATION секунд запрашивают профиль пользователя - один
+запрос к Postgres на запрос. Логгер SQLAlchemy пишет каждый запрос к базе (INFO, как echo)
+или еще и строки результата (DEBUG, как echo='debug'), корневой логгер - на том же уровне.
+Логи идут в обработчики LOGGING (stderr), результаты печатаются в stdout по окончании:
+
+    pip install -r tests/benchmark/requirements.txt
+    PYTHONPATH=. python tests/benchmark/logging_pipeline.py 2>/dev/null
+
+Пользователь удаляется по окончании.
+"""
+import asyncio
+import logging
+import statistics
+import time
+import uuid
+
+import httpx
+from sqlalchemy import delete
+
+from core.config import logging_settings
+from core.logger import start_logging, stop_logging
+from db.postgres import async_session, engine
+from main import app, lifespan
+from models.user import User
+from services.login_throttle import login_throttle
+
+CONCURRENCY = 20
+DURATION = 10
+PASSWORD = 'qwerty'
+
+
+async def load(client: httpx.AsyncClient, headers: dict) -> tuple[float, list[float]]:
+    latencies = []
+    deadline = time.perf_counter() + DURATION
+
+    async def worker() -> None:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.get('/api/v1/auth/profile', headers=headers)
+            assert response.status_code == 200, response.text
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    return len(latencies) / (time.perf_counter() - started), latencies
+
+
+async def main() -> None:
+    # Очередью управляет сам бенчмарк, вход выполняется один раз.
+    logging_settings.queue = False
+    login_throttle.enabled = False
+    # Журнал запросов клиента не относится к приложению.
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    login_name = f'bench_{uuid.uuid4().hex[:8]}'
+    results = []
+    try:
+        async with lifespan(app), httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url='http://auth'
+        ) as client:
+            await client.post('/api/v1/auth/signup', json={
+                'login': login_name, 'password': PASSWORD, 'first_name': 'bench', 'last_name': 'bench',
+                'email': f'{login_name}@example.com',
+            })
+            response = await client.post('/api/v1/auth/login', json={'login': login_name, 'password': PASSWORD})
+            headers = {'Authorization': f'Bearer {response.json()["access_token"]}'}
+
+            for level in (logging.INFO, logging.DEBUG):
+                for queued in (False, True):
+                    logging.getLogger().setLevel(level)
+                    logging.getLogger('sqlalchemy.engine').setLevel(level)
+                    if queued:
+                        start_logging()
+                    rps, latencies = await load(client, headers)
+                    if queued:
+                        stop_logging()
+                    logging.getLogger().setLevel(logging.INFO)
+                    logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+                    results.append((logging.getLevelName(level), 'queue' if queued else 'inline', rps, latencies))
+    finally:
+        async with async_session() as db:
+            await db.execute(delete(User).where(User.login == login_name))
+            await db.commit()
+        await engine.dispose()
+
+    for level, mode, rps, latencies in results:
+        p50, p99 = statistics.median(latencies) * 1000, statistics.quantiles(latencies, n=100)[98] * 1000
+        print(f'{level:5} {mode:6} requests/s={rps:8.1f} p50={p50:7.2f}ms p99={p99:7.2f}ms')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
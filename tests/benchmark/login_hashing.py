@@ -0,0 +1,72 @@
+"""
+Задержка входа при проверке пароля в цикле событий и в пуле хэширования.
+
+Запускает CONCURRENCY одновременных "входов": каждый ждет ответа базы (эмулируется
+asyncio.sleep) и проверяет пароль. Параллельно меряется задержка цикла событий,
+то есть насколько хэширование тормозит все остальные запросы воркера.
+
+    PYTHONPATH=auth python tests/benchmark/login_hashing.py
+"""
+import asyncio
+import statistics
+import time
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from core.config import hashing_settings
+from utils.hashing import shutdown_executor, verify_password
+
+CONCURRENCY = 200
+DB_LATENCY = 0.002
+PASSWORD = 'qwerty'
+
+
+def percentile(values: list[float], q: int) -> float:
+    return statistics.quantiles(values, n=100)[q - 1] * 1000
+
+
+async def inline_check(password_hash: str) -> bool:
+    return check_password_hash(password_hash, PASSWORD)
+
+
+async def login(check, password_hash: str) -> float:
+    started = time.perf_counter()
+    await asyncio.sleep(DB_LATENCY)
+    assert await check(password_hash)
+    return time.perf_counter() - started
+
+
+async def loop_lag(stop: asyncio.Event, lags: list[float]) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - started - 0.001)
+
+
+async def run(name: str, check, password_hash: str) -> None:
+    stop, lags = asyncio.Event(), []
+    probe = asyncio.create_task(loop_lag(stop, lags))
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(login(check, password_hash) for _ in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+    print(
+        f'{name:10} logins/s={CONCURRENCY / elapsed:8.1f} '
+        f'p50={percentile(latencies, 50):8.1f}ms p99={percentile(latencies, 99):8.1f}ms '
+        f'loop lag max={max(lags, default=0) * 1000:8.1f}ms'
+    )
+
+
+async def main() -> None:
+    password_hash = generate_password_hash(
+        PASSWORD, method=hashing_settings.get_method(), salt_length=hashing_settings.salt_length
+    )
+    print(f'method={hashing_settings.get_method()} executor={hashing_settings.executor} concurrency={CONCURRENCY}')
+    await run('inline', inline_check, password_hash)
+    await run('executor', lambda h: verify_password(h, PASSWORD), password_hash)
+    shutdown_executor()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+"""
+Число обращений к Postgres и пропускная способность входа через AuthService.authenticate.
+
+Создает пользователя с несколькими ролями и выполняет вход: сначала один раз с подсчетом
+SQL-запросов и COMMIT, затем CONCURRENCY сопрограммами в течение DURATION секунд.
+Пароль хэшируется дешевым методом, чтобы время входа определялось базой, а не хэшированием.
+Пользователь, его роли и сессии удаляются по окончании.
+
+    PYTHONPATH=auth python tests/benchmark/login_round_trips.py
+"""
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import delete, event
+from werkzeug.security import generate_password_hash
+
+from db.postgres import async_session, engine
+from models import Role, UserRole
+from models.session import Session
+from models.user import User
+from services.auth import AuthService
+from services.auth_context import AuthContext
+from services.login_throttle import login_throttle
+
+CONCURRENCY = 20
+DURATION = 10
+ROLES = 5
+PASSWORD = 'qwerty'
+
+
+async def login(login_name: str) -> None:
+    async with async_session() as db:
+        await AuthService(db, AuthContext(), None).authenticate(login_name, PASSWORD)
+
+
+async def worker(login_name: str, deadline: float, counter: list[int]) -> None:
+    while time.perf_counter() < deadline:
+        await login(login_name)
+        counter[0] += 1
+
+
+async def main() -> None:
+    # Входы повторяются одним пользователем, ограничение частоты входов здесь не меряется.
+    login_throttle.enabled = False
+    suffix = uuid.uuid4().hex[:8]
+    user = User(
+        login=f'bench_{suffix}', password=generate_password_hash(PASSWORD, method='pbkdf2:sha256:1'),
+        first_name='bench', last_name='bench', email=None
+    )
+    roles = [Role(name=f'bench_{suffix}_{i}') for i in range(ROLES)]
+    async with async_session() as db:
+        db.add_all([user, *roles])
+        await db.flush()
+        db.add_all([UserRole(user_id=user.id, role_id=role.id) for role in roles])
+        await db.commit()
+
+    try:
+        statements, commits = [], []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        def on_commit(conn):
+            commits.append(conn)
+
+        event.listen(engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(engine.sync_engine, 'commit', on_commit)
+        await login(user.login)
+        event.remove(engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+        event.remove(engine.sync_engine, 'commit', on_commit)
+        print(f'round trips per login: {len(statements)} statements + {len(commits)} commit')
+        for statement in statements:
+            print('   ', ' '.join(statement.split())[:100])
+
+        counter = [0]
+        deadline = time.perf_counter() + DURATION
+        await asyncio.gather(*(worker(user.login, deadline, counter) for _ in range(CONCURRENCY)))
+        print(f'concurrency={CONCURRENCY} duration={DURATION}s logins/s={counter[0] / DURATION:.1f}')
+    finally:
+        async with async_session() as db:
+            await db.execute(delete(Session).where(Session.user_id == user.id))
+            await db.execute(delete(UserRole).where(UserRole.user_id == user.id))
+            await db.execute(delete(Role).where(Role.id.in_([role.id for role in roles])))
+            await db.execute(delete(User).where(User.id == user.id))
+            await db.commit()
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
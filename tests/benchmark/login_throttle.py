@@ -0,0 +1,89 @@
+"""
+Процессорное время воркера под потоком входов с неверным паролем с ограничением частоты входов и без него.
+
+Создает пользователя с паролем, хэшированным настроенным методом (HASHING_*), и выполняет
+FLOOD попыток входа под ним с неверным паролем CONCURRENCY сопрограммами через приложение
+в процессе (httpx.ASGITransport, Redis и Postgres настоящие). Печатает отклоненные (429)
+попытки, процессорное время на попытку и попытки в секунду. Процессорное время учитывает
+потоки пула хэширования (HASHING_EXECUTOR=thread, по умолчанию), но не процессы пула process.
+Пользователь и счетчики попыток удаляются по окончании.
+
+    pip install -r tests/benchmark/requirements.txt
+    PYTHONPATH=. python tests/benchmark/login_throttle.py
+"""
+import asyncio
+import time
+import uuid
+
+import httpx
+from sqlalchemy import delete
+from werkzeug.security import generate_password_hash
+
+from core.config import hashing_settings
+from db import redisdb
+from db.postgres import async_session, engine
+from main import app, lifespan
+from models.user import User
+from services.login_throttle import IP_KEY, LOGIN_KEY, login_throttle
+
+FLOOD = 1000
+CONCURRENCY = 50
+PASSWORD = 'qwerty'
+# Адрес клиента, который httpx.ASGITransport передает приложению.
+CLIENT_IP = '127.0.0.1'
+
+
+async def flood(client: httpx.AsyncClient, login_name: str) -> list[int]:
+    statuses = []
+    attempts = iter(range(FLOOD))
+
+    async def worker() -> None:
+        for _ in attempts:
+            response = await client.post('/api/v1/auth/login', json={'login': login_name, 'password': 'wrong'})
+            statuses.append(response.status_code)
+
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    return statuses
+
+
+async def run(name: str, enabled: bool, login_name: str) -> None:
+    login_throttle.enabled = enabled
+    keys = [LOGIN_KEY.format(login_name), IP_KEY.format(CLIENT_IP)]
+    async with lifespan(app), httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url='http://auth'
+    ) as client:
+        await redisdb.redis.delete(*keys)
+        cpu, started = time.process_time(), time.perf_counter()
+        statuses = await flood(client, login_name)
+        cpu, elapsed = time.process_time() - cpu, time.perf_counter() - started
+        await redisdb.redis.delete(*keys)
+    print(
+        f'{name:12} attempts={FLOOD} rejected={statuses.count(429):5} cpu={cpu:6.1f}s '
+        f'cpu/attempt={cpu / FLOOD * 1000:7.2f}ms attempts/s={FLOOD / elapsed:8.1f}'
+    )
+
+
+async def main() -> None:
+    user = User(
+        login=f'bench_{uuid.uuid4().hex[:8]}',
+        password=generate_password_hash(
+            PASSWORD, method=hashing_settings.get_method(), salt_length=hashing_settings.salt_length
+        ),
+        first_name='bench', last_name='bench', email=None,
+    )
+    async with async_session() as db:
+        db.add(user)
+        await db.commit()
+    print(f'method={hashing_settings.get_method()} concurrency={CONCURRENCY}')
+    try:
+        await run('unthrottled', False, user.login)
+        await run('throttled', True, user.login)
+    finally:
+        async with async_session() as db:
+            await db.execute(delete(User).where(User.login == user.login))
+            await db.commit()
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
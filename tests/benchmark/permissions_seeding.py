@@ -0,0 +1,77 @@
+"""
+Время заполнения доступов при одновременном старте воркеров.
+
+WORKERS сопрограмм со своими соединениями одновременно заполняют PERMISSIONS доступов,
+как воркеры gunicorn в lifespan: прежним циклом (SELECT и, если доступа нет, INSERT
+с COMMIT на каждый доступ) и utils.db_utils.seed_permissions (один INSERT ... ON CONFLICT
+и один SELECT под advisory-блокировкой). Каждый способ запускается на пустой таблице
+(холодный старт) и на заполненной (перезапуск). Под gunicorn seed_permissions выполняет
+только мастер, так что время старта всех воркеров - время одного вызова.
+Созданные доступы удаляются по окончании.
+
+    PYTHONPATH=auth python tests/benchmark/permissions_seeding.py
+"""
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import delete, event, insert, select
+
+from db.postgres import async_session, engine
+from models.permission import Permission
+from utils.db_utils import seed_permissions
+
+WORKERS = 8
+PERMISSIONS = 50
+
+
+async def seed_by_one(names: list[str]) -> dict[str, uuid.UUID]:
+    # Прежняя реализация create_permissions.
+    ids = {}
+    async with async_session() as db:
+        for name in names:
+            permission_id = (await db.execute(select(Permission.id).where(Permission.name == name))).scalar()
+            if not permission_id:
+                permission_id = (await db.execute(
+                    insert(Permission).values(name=name).returning(Permission.id)
+                )).scalar()
+                await db.commit()
+            ids[name] = permission_id
+    return ids
+
+
+async def boot(seed, names: list[str]) -> tuple[float, int, int]:
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+    errors = 0
+    start = time.perf_counter()
+    for result in await asyncio.gather(*(seed(names) for _ in range(WORKERS)), return_exceptions=True):
+        errors += isinstance(result, Exception)
+    elapsed = time.perf_counter() - start
+    event.remove(engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+    return elapsed, len(statements), errors
+
+
+async def main() -> None:
+    for seed in (seed_by_one, seed_permissions):
+        names = [f'BENCH_{uuid.uuid4().hex[:8]}_{i}_PERMISSION' for i in range(PERMISSIONS)]
+        try:
+            for start in ('cold', 'warm'):
+                elapsed, statements, errors = await boot(seed, names)
+                print(
+                    f'{seed.__name__:16} {start}: workers={WORKERS} permissions={PERMISSIONS} '
+                    f'time={elapsed * 1000:.1f}ms statements={statements} failed workers={errors}'
+                )
+        finally:
+            async with async_session() as db:
+                await db.execute(delete(Permission).where(Permission.name.in_(names)))
+                await db.commit()
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+"""
+Задержка входа с записью сессии в Postgres при входе и через журнал сессий в Redis.
+
+Создает пользователя и выполняет входы через AuthService.authenticate: CONCURRENCY сопрограмм
+в течение DURATION секунд в каждом режиме. В режиме журнала сессии пишет в Postgres
+фоновый писатель, как в lifespan сервиса; после замера дожидаемся, пока он запишет остаток.
+Пароль хэшируется дешевым методом, чтобы время входа определялось базами, а не хэшированием.
+
+    PYTHONPATH=auth python tests/benchmark/session_journal.py
+"""
+import asyncio
+import statistics
+import time
+import uuid
+
+from redis.asyncio import Redis
+from sqlalchemy import delete, func, select
+from werkzeug.security import generate_password_hash
+
+from core.config import redis_settings
+from db.postgres import async_session, engine
+from models.session import Session
+from models.user import User
+from services.auth import AuthService
+from services.auth_context import AuthContext
+from services.login_throttle import login_throttle
+from services.session_journal import JOURNAL_STREAM, session_journal
+
+CONCURRENCY = 50
+DURATION = 10
+PASSWORD = 'qwerty'
+
+
+async def worker(redis: Redis, login: str, deadline: float, latencies: list[float]) -> None:
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        async with async_session() as db:
+            await AuthService(db, AuthContext(), redis).authenticate(login, PASSWORD)
+        latencies.append(time.perf_counter() - started)
+
+
+async def run(name: str, redis: Redis, login: str) -> None:
+    latencies = []
+    deadline = time.perf_counter() + DURATION
+    await asyncio.gather(*(worker(redis, login, deadline, latencies) for _ in range(CONCURRENCY)))
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(
+        f'{name:8} logins/s={len(latencies) / DURATION:8.1f} '
+        f'p50={quantiles[49] * 1000:7.2f}ms p99={quantiles[98] * 1000:7.2f}ms'
+    )
+
+
+async def main() -> None:
+    # Входы повторяются одним пользователем, ограничение частоты входов здесь не меряется.
+    login_throttle.enabled = False
+    redis = Redis(**redis_settings.model_dump())
+    user = User(
+        login=f'bench_{uuid.uuid4().hex[:8]}', password=generate_password_hash(PASSWORD, method='pbkdf2:sha256:1'),
+        first_name='bench', last_name='bench', email=None
+    )
+    async with async_session() as db:
+        db.add(user)
+        await db.commit()
+
+    writer = asyncio.create_task(session_journal.consume(redis))
+    try:
+        print(f'concurrency={CONCURRENCY} duration={DURATION}s')
+        session_journal.enabled = False
+        await run('sync', redis, user.login)
+
+        session_journal.enabled = True
+        await run('journal', redis, user.login)
+        started = time.perf_counter()
+        while await redis.xlen(JOURNAL_STREAM):
+            await asyncio.sleep(0.05)
+        async with async_session() as db:
+            written = await db.scalar(select(func.count()).select_from(Session).where(Session.user_id == user.id))
+        print(f'journal drained in {time.perf_counter() - started:.2f}s, sessions in Postgres: {written}')
+    finally:
+        writer.cancel()
+        async with async_session() as db:
+            await db.execute(delete(Session).where(Session.user_id == user.id))
+            await db.execute(delete(User).where(User.id == user.id))
+            await db.commit()
+        await engine.dispose()
+        await redis.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+"""
+Время запросов выхода и истории входов по таблице сессий без индексов и с индексами.
+
+Создает рядом с sessions нежурналируемую копию на ROWS строк, меряет запросы AuthService
+через EXPLAIN ANALYZE, затем строит индексы миграции b09a7c4c68a0 и повторяет замеры.
+Копия удаляется по окончании. Заполнение 10 млн строк занимает несколько минут.
+
+    PYTHONPATH=auth python tests/benchmark/sessions_indexes.py
+"""
+import json
+import re
+
+import psycopg
+
+from core.config import postgres_settings
+
+ROWS = 10_000_000
+USERS = 100_000
+REPEATS = 5
+TABLE = 'bench_sessions'
+
+QUERIES = {
+    'logout': f"""
+        SELECT refresh_jti, expire FROM {TABLE}
+        WHERE user_id = %(user_id)s AND expire >= now() AT TIME ZONE 'utc' AND revoked_at IS NULL
+    """,
+    'history': f"""
+        SELECT id, created_at FROM {TABLE}
+        WHERE user_id = %(user_id)s
+        ORDER BY created_at DESC
+        LIMIT 100
+    """,
+}
+
+INDEXES = [
+    f'CREATE INDEX ON {TABLE} (user_id, expire) WHERE revoked_at IS NULL',
+    f'CREATE INDEX ON {TABLE} (user_id, created_at DESC)',
+]
+
+
+def prepare(conn: psycopg.Connection) -> None:
+    conn.execute(f'DROP TABLE IF EXISTS {TABLE}')
+    conn.execute(f"""
+        CREATE UNLOGGED TABLE {TABLE} (
+            id uuid PRIMARY KEY,
+            user_id uuid,
+            refresh_token varchar NOT NULL,
+            refresh_jti uuid,
+            expire timestamp NOT NULL,
+            revoked_at timestamp,
+            created_at timestamp,
+            modified_at timestamp
+        )
+    """)
+    # Пользователи - детерминированные uuid из номера, сессии равномерно за последний год.
+    conn.execute(f"""
+        INSERT INTO {TABLE}
+        SELECT
+            gen_random_uuid(),
+            md5((n % {USERS})::text)::uuid,
+            repeat('x', 300),
+            gen_random_uuid(),
+            created + interval '24 hours',
+            CASE WHEN random() < 0.5 THEN created + interval '1 hour' END,
+            created,
+            created
+        FROM (
+            SELECT n, now() AT TIME ZONE 'utc' - random() * interval '365 days' AS created
+            FROM generate_series(1, {ROWS}) AS n
+        ) AS s
+    """)
+    conn.execute(f'ANALYZE {TABLE}')
+    conn.commit()
+
+
+def measure(conn: psycopg.Connection) -> dict[str, float]:
+    result = {}
+    for name, query in QUERIES.items():
+        timings = []
+        for i in range(REPEATS):
+            user_id = conn.execute('SELECT md5(%s::text)::uuid', (i * 7919 % USERS,)).fetchone()[0]
+            plan = conn.execute(f'EXPLAIN (ANALYZE, FORMAT JSON) {query}', {'user_id': user_id}).fetchone()[0]
+            plan = plan if isinstance(plan, list) else json.loads(plan)
+            timings.append(plan[0]['Execution Time'])
+        result[name] = sorted(timings)[len(timings) // 2]
+    return result
+
+
+def main() -> None:
+    dsn = re.sub(r'^postgresql\+psycopg', 'postgresql', postgres_settings.get_dsn())
+    with psycopg.connect(dsn) as conn:
+        print(f'Filling {TABLE} with {ROWS} sessions of {USERS} users...')
+        prepare(conn)
+        before = measure(conn)
+        for index in INDEXES:
+            conn.execute(index)
+        conn.execute(f'ANALYZE {TABLE}')
+        conn.commit()
+        after = measure(conn)
+        conn.execute(f'DROP TABLE {TABLE}')
+        conn.commit()
+
+    print(f'{"query":10} {"no index, ms":>14} {"indexed, ms":>14}')
+    for name in QUERIES:
+        print(f'{name:10} {before[name]:14.2f} {after[name]:14.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Скорость массового импорта пользователей cli/users_import.py.
+
+Генерирует NDJSON с USERS пользователями с готовыми хэшами паролей и HASHED пользователями
+с паролями, которые хэшируются при импорте настроенным методом (HASHING_*), у каждого
+пользователя одна роль. Запускает импорт отдельным процессом и печатает пользователей
+в минуту. Цель - больше 50 тыс. в минуту; с паролями скорость определяется стоимостью
+хэширования и числом ядер. Созданные пользователи и роль удаляются по окончании.
+
+    PYTHONPATH=. python tests/benchmark/users_import.py
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import delete
+from werkzeug.security import generate_password_hash
+
+from db.postgres import async_session, engine
+from models import Role
+from models.user import User
+
+USERS = 200000
+HASHED = 2000
+CHUNK_SIZE = 10000
+
+
+def run_import(prefix: str, count: int, password: dict, role: str) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'users.ndjson')
+        with open(path, 'w') as file:
+            for i in range(count):
+                file.write(json.dumps({
+                    'login': f'{prefix}_{i}', 'first_name': 'bench', 'last_name': 'bench',
+                    'email': f'{prefix}_{i}@example.com', 'roles': [role],
+                } | password) + '\n')
+        started = time.perf_counter()
+        subprocess.run(
+            [sys.executable, 'cli/users_import.py', path, '--chunk-size', str(CHUNK_SIZE)],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+        elapsed = time.perf_counter() - started
+        mode = 'hashing' if 'password' in password else 'pre-hashed'
+        print(f'{mode:10} users={count} time={elapsed:.1f}s users/min={count / elapsed * 60:.0f}')
+
+
+async def main() -> None:
+    prefix = f'bench_{uuid.uuid4().hex[:8]}'
+    async with async_session() as db:
+        db.add(Role(name=f'{prefix}_role'))
+        await db.commit()
+    try:
+        password_hash = generate_password_hash('qwerty')
+        run_import(f'{prefix}_pre', USERS, {'password_hash': password_hash}, f'{prefix}_role')
+        run_import(f'{prefix}_hash', HASHED, {'password': 'qwerty'}, f'{prefix}_role')
+    finally:
+        async with async_session() as db:
+            await db.execute(delete(User).where(User.login.startswith(prefix)))
+            await db.execute(delete(Role).where(Role.name.startswith(prefix)))
+            await db.commit()
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -7,6 +7,7 @@ import psycopg
 import aiohttp
 import pytest
 import pytest_asyncio
+from prometheus_client.parser import text_string_to_metric_families
 from psycopg import Connection
 from werkzeug.security import generate_password_hash
 
@@ -106,6 +107,36 @@ def make_patch_request(http_session):
     return inner
 
 
+@pytest.fixture
+def make_put_request(http_session):
+    async def inner(url: str, settings: BaseTestSettings, **kwargs):
+        async with http_session.put(
+                settings.service_url + url, **kwargs
+        ) as response:
+            body = await response.json()
+            headers = response.headers
+            status = response.status
+        return {'status': status, 'body': body, 'headers': headers}
+
+    return inner
+
+
+@pytest.fixture
+def get_metrics(http_session):
+    async def inner(settings: BaseTestSettings) -> dict[str, list]:
+        """Метрики сервиса по имени серии: {name: [Sample, ...]}."""
+        async with http_session.get(settings.service_url + '/metrics/') as response:
+            assert response.status == 200
+            text = await response.text()
+        samples = {}
+        for family in text_string_to_metric_families(text):
+            for sample in family.samples:
+                samples.setdefault(sample.name, []).append(sample)
+        return samples
+
+    return inner
+
+
 @pytest.fixture(scope='session', autouse=True)
 def faker_seed():
     return randint(0, sys.maxsize)
@@ -221,6 +252,17 @@ def pg_set_roles(pg_client, pg_drop_roles):
     return inner
 
 
+@pytest.fixture
+def pg_set_user_roles(pg_client):
+    async def inner(user_roles: list[dict[str, str]]):
+        query = 'INSERT INTO user_roles (id, user_id, role_id) VALUES (%s, %s, %s)'
+        for user_role in user_roles:
+            pg_client.execute(query, (str(uuid4()), user_role['user_id'], user_role['role_id']))
+        pg_client.commit()
+
+    return inner
+
+
 @pytest.fixture
 def pg_get_permissions(pg_client, pg_drop_roles):
     async def inner():
@@ -28,8 +28,21 @@ class BaseTestSettings(BaseSettings):
 
 
 class AuthTestSettings(BaseTestSettings):
-    pass
+    # Совпадает с PROJECT_LOGIN_THROTTLE_LOGIN_LIMIT сервиса в docker-compose.yml.
+    login_throttle_login_limit: int = Field(1000)
+    # Ключи подписи токенов сервиса, см. PROJECT_JWT_KEYS_DIR в docker-compose.yml.
+    jwt_algorithm: str = Field('RS256')
+    jwt_keys_dir: str = Field('tests/functional/testdata/jwt_keys')
+    jwt_signing_kid: str = Field('2024-02')
+    jwt_retired_kid: str = Field('2024-01')
+
+
+class OptimizedAuthTestSettings(AuthTestSettings):
+    # Экземпляр сервиса с доступами в токене и журналом сессий, см. auth-optimized в docker-compose.yml.
+    service_url: str = Field('http://127.0.0.1:8001')
+    model_config = SettingsConfigDict(env_prefix='optimized_')
 
 
 session_settings = SessionSettings()
 test_settings = AuthTestSettings()
+optimized_test_settings = OptimizedAuthTestSettings()
@@ -1,6 +1,9 @@
 import http
+import time
+from pathlib import Path
 from random import randint
 
+import jwt
 import pytest
 
 from tests.functional.settings import test_settings
@@ -71,6 +74,61 @@ async def test_login(
     await clear_all()
 
 
+@pytest.mark.asyncio(scope="session")
+async def test_login_throttle(
+        clear_all, generate_fake_users, pg_set_users, method_login, redis_client
+):
+    # 1. Подготовка данных: окно попыток входа пользователя уже заполнено.
+    fake_users = await generate_fake_users(1)
+    await pg_set_users(fake_users)
+    user = fake_users[0]
+    now = time.time() * 1000
+    await redis_client.zadd(f'login_throttle:login:{user["login"]}', {
+        f'attempt_{i}': now for i in range(test_settings.login_throttle_login_limit)
+    })
+
+    # 2. Тестирование отказа во входе до проверки пароля, даже с верным паролем.
+    response = await method_login(test_settings, login=user['login'], password=user['password'])
+    assert response['status'] == http.HTTPStatus.TOO_MANY_REQUESTS
+    assert int(response['headers']['Retry-After']) > 0
+
+    # 3. Тестирование входа после освобождения окна.
+    await redis_client.delete(f'login_throttle:login:{user["login"]}')
+    response = await method_login(test_settings, login=user['login'], password=user['password'])
+    assert response['status'] == http.HTTPStatus.OK
+
+    # 4. Очистка.
+    await clear_all()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_login_throttle_spoofed_forwarded_for(
+        clear_all, generate_fake_users, pg_set_users, make_post_request, redis_client
+):
+    method_name = '/api/v1/auth/login'
+    spoofed = [f'203.0.113.{i}' for i in range(5)]
+
+    # 1. Подготовка данных.
+    fake_users = await generate_fake_users(1)
+    await pg_set_users(fake_users)
+    user = fake_users[0]
+
+    # 2. Тестирование: адрес из заголовков клиента не учитывается, все попытки считаются по адресу подключения.
+    for address in spoofed:
+        response = await make_post_request(
+            method_name, test_settings, json={'login': user['login'], 'password': 'wrong'},
+            headers={'X-Forwarded-For': address, 'X-Real-IP': address}
+        )
+        assert response['status'] == http.HTTPStatus.FORBIDDEN
+    keys = [key.decode() async for key in redis_client.scan_iter('login_throttle:ip:*')]
+    assert len(keys) == 1
+    assert keys[0].removeprefix('login_throttle:ip:') not in spoofed
+    assert await redis_client.zcard(keys[0]) == len(spoofed)
+
+    # 3. Очистка.
+    await clear_all()
+
+
 @pytest.mark.asyncio(scope="session")
 async def test_logout(
         generate_fake_users, pg_set_users, method_login, make_post_request, redis_flush_db, clear_all, auth_header
@@ -116,14 +174,23 @@ async def test_refresh(
         assert response['status'] == http.HTTPStatus.OK
         assert 'refresh_token' in response['body']
 
-        response = await method_refresh(test_settings, response['body']['refresh_token'])
+        first_refresh_token = response['body']['refresh_token']
+        response = await method_refresh(test_settings, first_refresh_token)
         assert response['status'] == http.HTTPStatus.OK
         assert 'access_token' in response['body']
+        assert response['body']['refresh_token'] != first_refresh_token
+        second_refresh_token = response['body']['refresh_token']
 
         response = await method_get_profile(test_settings, response['body']['access_token'])
         assert response['status'] == http.HTTPStatus.OK
 
-    # 3. Очистка.
+        # 3. Повторное использование прежнего токена обновления отзывает всю сессию.
+        response = await method_refresh(test_settings, first_refresh_token)
+        assert response['status'] == http.HTTPStatus.UNAUTHORIZED
+        response = await method_refresh(test_settings, second_refresh_token)
+        assert response['status'] == http.HTTPStatus.UNAUTHORIZED
+
+    # 4. Очистка.
     await clear_all()
 
 
@@ -156,9 +223,12 @@ async def test_refresh_revoke(
            await method_refresh(test_settings, response['body']['refresh_token'])
         )['status'] == http.HTTPStatus.UNAUTHORIZED
 
+        # Сессия хранится в Redis: без нее токен обновления недействителен.
         await redis_flush_db()
 
-        assert (await method_refresh(test_settings, response['body']['refresh_token']))['status'] == http.HTTPStatus.OK
+        assert (
+           await method_refresh(test_settings, response['body']['refresh_token'])
+        )['status'] == http.HTTPStatus.UNAUTHORIZED
 
     # 3. Очистка.
     await clear_all()
@@ -349,3 +419,94 @@ async def test_get_history(
 
     # 3. Очистка.
     await clear_all()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_get_history_cursor(
+        generate_fake_users, pg_set_users, method_login, clear_all, auth_header, make_get_request
+):
+    method_name = '/api/v1/auth/history'
+
+    # 1. Подготовка данных.
+    fake_users = await generate_fake_users(1)
+    await pg_set_users(fake_users)
+    user = fake_users[0]
+    session_ids = []
+    for _ in range(3):
+        response = await method_login(test_settings, login=user['login'], password=user['password'])
+        assert response['status'] == http.HTTPStatus.OK
+        session_ids.append(response['body']['session_id'])
+    headers = await auth_header(response['body']['access_token'])
+
+    # 2. Тестирование постраничного получения истории по курсору.
+    response = await make_get_request(method_name, test_settings, headers=headers, params={'pagesize': 2})
+    assert response['status'] == http.HTTPStatus.OK
+    assert [session['id'] for session in response['body']] == session_ids[:0:-1]
+    assert 'X-Next-Cursor' in response['headers']
+
+    response = await make_get_request(method_name, test_settings, headers=headers, params={
+        'pagesize': 2, 'cursor': response['headers']['X-Next-Cursor']
+    })
+    assert response['status'] == http.HTTPStatus.OK
+    assert [session['id'] for session in response['body']] == session_ids[:1]
+    assert 'X-Next-Cursor' not in response['headers']
+
+    # 3. Тестирование некорректного курсора.
+    response = await make_get_request(method_name, test_settings, headers=headers, params={'cursor': 'invalid'})
+    assert response['status'] == http.HTTPStatus.BAD_REQUEST
+
+    # 4. Очистка.
+    await clear_all()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_jwks(
+        clear_all, generate_fake_users, pg_set_users, make_get_request, method_login, auth_header
+):
+    method_name = '/.well-known/jwks.json'
+
+    # 1. Подготовка данных: сервис подписывает токены ключами из testdata/jwt_keys (docker-compose.yml).
+    await clear_all()
+    user = (await generate_fake_users(1))[0]
+    await pg_set_users([user])
+    response = await method_login(test_settings, user['login'], user['password'])
+    assert response['status'] == http.HTTPStatus.OK
+    access_token = response['body']['access_token']
+
+    # 2. Тестирование публикации открытых ключей.
+    response = await make_get_request(method_name, test_settings)
+    assert response['status'] == http.HTTPStatus.OK
+    assert 'max-age' in response['headers']['Cache-Control']
+    keys = {key['kid']: key for key in response['body']['keys']}
+    assert set(keys) == {test_settings.jwt_signing_kid, test_settings.jwt_retired_kid}
+    for key in keys.values():
+        assert key['alg'] == test_settings.jwt_algorithm and key['kty'] == 'RSA' and 'd' not in key
+
+    # 3. Токен подписан текущим ключом и проверяется опубликованным открытым ключом.
+    header = jwt.get_unverified_header(access_token)
+    assert header['kid'] == test_settings.jwt_signing_kid
+    claims = jwt.decode(
+        access_token, jwt.PyJWK(keys[header['kid']]).key, algorithms=[test_settings.jwt_algorithm]
+    )
+    assert claims['sub'] == str(user['id'])
+
+    # 4. Токен, подписанный прежним ключом, действует, пока ключ лежит в каталоге.
+    retired_key = Path(test_settings.jwt_keys_dir, f'{test_settings.jwt_retired_kid}.pem').read_text()
+    retired_token = jwt.encode(
+        claims, retired_key, algorithm=test_settings.jwt_algorithm, headers={'kid': test_settings.jwt_retired_kid}
+    )
+    jwt.decode(retired_token, jwt.PyJWK(keys[test_settings.jwt_retired_kid]).key,
+               algorithms=[test_settings.jwt_algorithm])
+    response = await make_get_request('/api/v1/auth/profile', test_settings, headers=await auth_header(retired_token))
+    assert response['status'] == http.HTTPStatus.OK
+
+    # 5. Токен с неизвестным ключом отклоняется.
+    response = await make_get_request(
+        '/api/v1/auth/profile', test_settings, headers=await auth_header(jwt.encode(
+            claims, retired_key, algorithm=test_settings.jwt_algorithm, headers={'kid': 'unknown'}
+        ))
+    )
+    assert response['status'] == http.HTTPStatus.UNPROCESSABLE_ENTITY
+
+    # 6. Очистка.
+    await clear_all()
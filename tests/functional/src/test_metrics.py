@@ -0,0 +1,57 @@
+import http
+
+import pytest
+
+from tests.functional.settings import test_settings
+
+# Серии, которые сервис отдает после входа и запроса профиля.
+EXPECTED_SERIES = (
+    'http_request_duration_seconds_count',
+    'http_request_stage_duration_seconds_count',
+    'http_request_db_queries_count',
+    'http_request_redis_commands_count',
+    'service_method_duration_seconds_count',
+    'db_query_duration_seconds_count',
+    'db_pool_checkout_wait_seconds_count',
+    'db_pool_checked_out',
+    'db_pool_saturation',
+    'redis_command_duration_seconds_count',
+    'password_hash_duration_seconds_count',
+    'jwt_duration_seconds_count',
+    'denylist_filter_lookups_total',
+)
+LOGINS = 20
+
+
+def login_count(samples: dict[str, list]) -> float:
+    return sum(
+        sample.value for sample in samples.get('http_request_duration_seconds_count', [])
+        if sample.labels['route'] == '/api/v1/auth/login' and sample.labels['status'] == '200'
+    )
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_metrics(
+        clear_all, generate_fake_users, pg_set_users, method_login, method_get_profile, get_metrics
+):
+    # 1. Подготовка данных.
+    user = (await generate_fake_users(1))[0]
+    await pg_set_users([user])
+    before = login_count(await get_metrics(test_settings))
+
+    # 2. Входы распределяются по воркерам gunicorn.
+    for _ in range(LOGINS):
+        response = await method_login(test_settings, user['login'], user['password'])
+        assert response['status'] == http.HTTPStatus.OK
+    response = await method_get_profile(test_settings, response['body']['access_token'])
+    assert response['status'] == http.HTTPStatus.OK
+
+    # 3. Тестирование метрик: любой воркер отдает серии всех воркеров.
+    samples = await get_metrics(test_settings)
+    for name in EXPECTED_SERIES:
+        assert name in samples, name
+    assert login_count(samples) - before == LOGINS
+    assert 0 <= samples['db_pool_saturation'][0].value <= 1
+
+    # 4. Очистка.
+    await clear_all()
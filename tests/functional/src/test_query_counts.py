@@ -0,0 +1,175 @@
+import asyncio
+import http
+
+import pytest
+
+from tests.functional.settings import BaseTestSettings, optimized_test_settings, test_settings
+from tests.functional.testdata.roles_test_data import get_admin_data
+
+# Число SQL-запросов, которое выполняет эндпоинт. Рост числа запросов - регрессия.
+EXPECTED_QUERIES = {
+    '/api/v1/auth/login': 2,
+    '/api/v1/auth/history': 1,
+    '/api/v1/auth/profile': 1,
+    '/api/v1/roles': 1,
+    '/api/v1/roles/{role_id}/permissions': 1,
+    '/api/v1/users/{user_id}/roles/{role_id}': 2,
+}
+
+
+@pytest.fixture
+def count_queries(get_metrics):
+    async def inner(settings: BaseTestSettings, route: str) -> float:
+        """Сумма запросов к Postgres по шаблону маршрута во всех воркерах сервиса (http_request_db_queries)."""
+        return sum(
+            sample.value for sample in (await get_metrics(settings)).get('http_request_db_queries_sum', [])
+            if sample.labels['route'] == route
+        )
+
+    return inner
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_endpoint_query_counts(
+        count_queries, make_get_request, make_post_request, method_login, auth_header, generate_fake_roles,
+        generate_fake_users, pg_set_roles, pg_set_users, pg_set_user_roles, pg_drop_users, pg_drop_roles,
+        pg_drop_user_roles
+):
+    # 1. Подготовка данных: роль со множеством пользователей, у каждого еще несколько ролей.
+    fake_roles = await generate_fake_roles(5)
+    await pg_set_roles(fake_roles)
+    admin = await get_admin_data()
+    fake_users = await generate_fake_users(50)
+    await pg_set_users(fake_users + [admin])
+    await pg_set_user_roles([
+        {'user_id': user['id'], 'role_id': role['id']} for user in fake_users for role in fake_roles[:4]
+    ])
+
+    # 2. Тестирование числа запросов каждого эндпоинта.
+    route = '/api/v1/auth/login'
+    before = await count_queries(test_settings, route)
+    response = await method_login(test_settings, admin['login'], admin['password'])
+    assert response['status'] == http.HTTPStatus.OK
+    assert await count_queries(test_settings, route) - before == EXPECTED_QUERIES[route]
+    headers = await auth_header(response['body']['access_token'])
+
+    for route, url in (
+            ('/api/v1/auth/history', '/api/v1/auth/history'),
+            ('/api/v1/auth/profile', '/api/v1/auth/profile'),
+            ('/api/v1/roles', '/api/v1/roles'),
+            ('/api/v1/roles/{role_id}/permissions', f"/api/v1/roles/{fake_roles[0]['id']}/permissions"),
+    ):
+        before = await count_queries(test_settings, route)
+        response = await make_get_request(url, test_settings, headers=headers)
+        assert response['status'] == http.HTTPStatus.OK
+        assert await count_queries(test_settings, route) - before == EXPECTED_QUERIES[route], route
+
+    route = '/api/v1/users/{user_id}/roles/{role_id}'
+    before = await count_queries(test_settings, route)
+    response = await make_post_request(
+        f"/api/v1/users/{fake_users[0]['id']}/roles/{fake_roles[4]['id']}", test_settings, headers=headers
+    )
+    assert response['status'] == http.HTTPStatus.CREATED
+    assert await count_queries(test_settings, route) - before == EXPECTED_QUERIES[route]
+
+    # 3. Очистка таблиц
+    await pg_drop_users()
+    await pg_drop_roles()
+    await pg_drop_user_roles()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_token_permissions_check_without_queries(
+        count_queries, make_get_request, make_post_request, make_delete_request, method_login, auth_header,
+        generate_fake_roles, generate_fake_users, pg_set_roles, pg_set_users, pg_set_user_roles, pg_get_permissions,
+        pg_drop_users, pg_drop_roles, pg_drop_user_roles, pg_drop_role_permissions
+):
+    # Сервис auth-optimized выдает токены с доступами (PROJECT_PERMISSIONS_IN_TOKEN).
+    settings = optimized_test_settings
+    method_name = '/api/v1/roles/{role_id}/permissions/{permission_id}'
+
+    # 1. Подготовка данных: у роли пользователя есть доступ к управлению ролями.
+    await pg_drop_role_permissions()
+    fake_roles = await generate_fake_roles(1)
+    await pg_set_roles(fake_roles)
+    admin = await get_admin_data()
+    user = (await generate_fake_users(1))[0] | {'superuser': False}
+    await pg_set_users([admin, user])
+    await pg_set_user_roles([{'user_id': user['id'], 'role_id': fake_roles[0]['id']}])
+    permission = next(
+        permission for permission in await pg_get_permissions() if permission['name'] == 'ROLE_MANAGEMENT_PERMISSION'
+    )
+    response = await method_login(settings, admin['login'], admin['password'])
+    admin_headers = await auth_header(response['body']['access_token'])
+    response = await make_post_request(
+        method_name.format(role_id=fake_roles[0]['id'], permission_id=permission['id']), settings,
+        headers=admin_headers
+    )
+    assert response['status'] == http.HTTPStatus.CREATED
+    response = await method_login(settings, user['login'], user['password'])
+    user_headers = await auth_header(response['body']['access_token'])
+
+    # 2. Доступ проверяется по токену: выполняется только запрос списка ролей.
+    route = '/api/v1/roles'
+    before = await count_queries(settings, route)
+    response = await make_get_request(route, settings, headers=user_headers)
+    assert response['status'] == http.HTTPStatus.OK
+    assert await count_queries(settings, route) - before == EXPECTED_QUERIES[route]
+
+    # 3. Изменение доступов роли делает доступы в токене устаревшими.
+    response = await make_delete_request(
+        method_name.format(role_id=fake_roles[0]['id'], permission_id=permission['id']), settings,
+        headers=admin_headers
+    )
+    assert response['status'] == http.HTTPStatus.NO_CONTENT
+    # Кэш доступов ролей других воркеров сбрасывается через pub/sub, поэтому отказ ждем с ограничением.
+    for _ in range(50):
+        response = await make_get_request(route, settings, headers=user_headers)
+        if response['status'] == http.HTTPStatus.FORBIDDEN:
+            break
+        await asyncio.sleep(0.1)
+    assert response['status'] == http.HTTPStatus.FORBIDDEN
+
+    # 4. Очистка таблиц
+    await pg_drop_users()
+    await pg_drop_roles()
+    await pg_drop_user_roles()
+    await pg_drop_role_permissions()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_session_journal_login(
+        count_queries, make_get_request, method_login, auth_header, generate_fake_users, pg_set_users, pg_drop_users
+):
+    # Сервис auth-optimized пишет сессии через журнал (PROJECT_SESSION_JOURNAL).
+    settings = optimized_test_settings
+    route = '/api/v1/auth/login'
+
+    # 1. Подготовка данных.
+    user = (await generate_fake_users(1))[0]
+    await pg_set_users([user])
+
+    # 2. Вход не пишет в Postgres: сессию записывает журнал. Подготовка данных очищает Redis,
+    # и воркеры пересоздают группу журнала, поэтому первые входы могут записать сессию сами.
+    for _ in range(20):
+        before = await count_queries(settings, route)
+        response = await method_login(settings, user['login'], user['password'])
+        assert response['status'] == http.HTTPStatus.OK
+        queries = await count_queries(settings, route) - before
+        if queries == EXPECTED_QUERIES[route] - 1:
+            break
+        await asyncio.sleep(0.5)
+    assert queries == EXPECTED_QUERIES[route] - 1
+    session_id = response['body']['session_id']
+    headers = await auth_header(response['body']['access_token'])
+
+    # 3. Сессия появляется в истории входов после записи из журнала.
+    for _ in range(50):
+        response = await make_get_request('/api/v1/auth/history', settings, headers=headers)
+        if session_id in [session['id'] for session in response['body']]:
+            break
+        await asyncio.sleep(0.1)
+    assert session_id in [session['id'] for session in response['body']]
+
+    # 4. Очистка таблиц
+    await pg_drop_users()
@@ -246,3 +246,108 @@ async def test_get_role_permissions(
     await pg_drop_users()
     await pg_drop_roles()
     await pg_drop_role_permissions()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_role_permission_change_applies_to_issued_tokens(
+        pg_drop_roles, pg_drop_users, generate_fake_roles, generate_fake_users, make_post_request, pg_set_roles,
+        pg_set_users, pg_set_user_roles, method_login, auth_header, pg_get_permissions,
+        pg_drop_role_permissions, pg_drop_user_roles, make_delete_request, make_get_request):
+    method_name = '/api/v1/roles/{role_id}/permissions/{permission_id}'
+
+    # 1. Подготовка данных.
+    await pg_drop_role_permissions()
+    fake_roles = await generate_fake_roles(1)
+    await pg_set_roles(fake_roles)
+    admin = await get_admin_data()
+    user = (await generate_fake_users(1))[0] | {'superuser': False}
+    await pg_set_users([admin, user])
+    await pg_set_user_roles([{'user_id': user['id'], 'role_id': fake_roles[0]['id']}])
+    permission = next(
+        permission for permission in await pg_get_permissions() if permission['name'] == 'ROLE_MANAGEMENT_PERMISSION'
+    )
+    admin_headers = await auth_header(
+        (await method_login(test_settings, login=admin['login'], password=admin['password']))['body']['access_token']
+    )
+    user_headers = await auth_header(
+        (await method_login(test_settings, login=user['login'], password=user['password']))['body']['access_token']
+    )
+
+    # 2. Без доступа у роли пользователь не может управлять ролями.
+    response = await make_get_request('/api/v1/roles', test_settings, headers=user_headers)
+    assert response['status'] == http.HTTPStatus.FORBIDDEN
+
+    # 3. Назначенный роли доступ действует для уже выданного токена.
+    response = await make_post_request(
+        method_name.format(role_id=fake_roles[0]['id'], permission_id=permission['id']), test_settings,
+        headers=admin_headers
+    )
+    assert response['status'] == http.HTTPStatus.CREATED
+    response = await make_get_request('/api/v1/roles', test_settings, headers=user_headers)
+    assert response['status'] == http.HTTPStatus.OK
+
+    # 4. Отозванный у роли доступ перестает действовать сразу.
+    response = await make_delete_request(
+        method_name.format(role_id=fake_roles[0]['id'], permission_id=permission['id']), test_settings,
+        headers=admin_headers
+    )
+    assert response['status'] == http.HTTPStatus.NO_CONTENT
+    response = await make_get_request('/api/v1/roles', test_settings, headers=user_headers)
+    assert response['status'] == http.HTTPStatus.FORBIDDEN
+
+    # 5. Очистка таблиц
+    await pg_drop_users()
+    await pg_drop_roles()
+    await pg_drop_user_roles()
+    await pg_drop_role_permissions()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_set_role_permissions(
+        pg_drop_roles, pg_drop_users, generate_fake_roles, make_post_request, make_put_request, make_get_request,
+        pg_set_roles, pg_set_users, method_login, auth_header, pg_get_permissions, generate_fake_permissions,
+        pg_drop_role_permissions
+):
+    method_name = '/api/v1/roles/{role_id}/permissions'
+
+    # 1. Подготовка данных.
+    fake_roles, fake_roles_test, permissions, fake_permissions, headers = \
+        await prepare_to_role_permissions_test(generate_fake_roles, pg_set_roles, pg_set_users, method_login,
+                                               auth_header, pg_get_permissions, generate_fake_permissions,
+                                               pg_drop_users, pg_drop_roles, pg_drop_role_permissions)
+    role = fake_roles[0]
+    first, *others = [str(permission['id']) for permission in permissions]
+    await make_post_request(method_name.format(role_id=role['id']) + f'/{first}', test_settings, headers=headers)
+
+    # 2. Тестирование замены доступов роли: прежний доступ удаляется, новые добавляются
+    response = await make_put_request(
+        method_name.format(role_id=role['id']), test_settings, headers=headers, json={'permission_ids': others}
+    )
+    assert response['status'] == http.HTTPStatus.OK
+    assert sorted(response['body']['added']) == sorted(others)
+    assert response['body']['removed'] == [first]
+    response = await make_get_request(method_name.format(role_id=role['id']), test_settings, headers=headers)
+    assert sorted(permission['id'] for permission in response['body']) == sorted(others)
+
+    # 3. Тестирование повторной замены тем же набором: изменений нет
+    response = await make_put_request(
+        method_name.format(role_id=role['id']), test_settings, headers=headers, json={'permission_ids': others}
+    )
+    assert response['body'] == {'added': [], 'removed': []}
+
+    # 4. Тестирование замены с несуществующими ролью и доступом
+    response = await make_put_request(
+        method_name.format(role_id=fake_roles_test[0]['id']), test_settings, headers=headers,
+        json={'permission_ids': others}
+    )
+    assert response['status'] == http.HTTPStatus.NOT_FOUND
+    response = await make_put_request(
+        method_name.format(role_id=role['id']), test_settings, headers=headers,
+        json={'permission_ids': [fake_permissions[0]['id']]}
+    )
+    assert response['status'] == http.HTTPStatus.BAD_REQUEST
+
+    # 5. Очистка таблиц
+    await pg_drop_users()
+    await pg_drop_roles()
+    await pg_drop_role_permissions()
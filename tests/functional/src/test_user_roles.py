@@ -207,3 +207,43 @@ async def test_delete_user_role_not_found(
     await pg_drop_users()
     await pg_drop_roles()
     await pg_drop_user_roles()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_assign_user_roles_bulk(
+        pg_drop_roles, pg_drop_users, generate_fake_roles, make_post_request, pg_set_roles, generate_fake_users,
+        pg_set_users, method_login, auth_header, pg_drop_user_roles
+):
+    method_name = '/api/v1/users/roles'
+
+    # 1. Подготовка данных.
+    fake_roles, fake_roles_test, fake_users, fake_users_test = \
+        await prepare_to_user_roles_test(generate_fake_roles, generate_fake_users, pg_set_roles, pg_set_users,
+                                         pg_drop_users, pg_drop_roles, pg_drop_user_roles)
+    headers = await get_headers(auth_header, method_login)
+    new = [{'user_id': user['id'], 'role_id': fake_roles[0]['id']} for user in fake_users[:5]]
+    missing_users = [{'user_id': user['id'], 'role_id': fake_roles[0]['id']} for user in fake_users_test[:3]]
+    missing_roles = [{'user_id': fake_users[0]['id'], 'role_id': role['id']} for role in fake_roles_test[:2]]
+
+    # 2. Тестирование назначения пачки ролей: новые пары и пары с несуществующими пользователями и ролями
+    response = await make_post_request(
+        method_name, test_settings, headers=headers,
+        json={'user_roles': new + missing_users + missing_roles}
+    )
+    assert response['status'] == http.HTTPStatus.OK
+    assert response['body']['assigned'] == new
+    assert response['body']['existing'] == []
+    assert [item['detail'] for item in response['body']['failed']] == \
+        ['User not found'] * len(missing_users) + ['Role not found'] * len(missing_roles)
+
+    # 3. Тестирование повторного назначения: пары уже назначены
+    headers = await get_headers(auth_header, method_login)
+    response = await make_post_request(method_name, test_settings, headers=headers, json={'user_roles': new})
+    assert response['status'] == http.HTTPStatus.OK
+    assert response['body']['assigned'] == []
+    assert response['body']['existing'] == new
+
+    # 4. Очистка таблиц
+    await pg_drop_users()
+    await pg_drop_roles()
+    await pg_drop_user_roles()